@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the bit/bytes codec in pyinterface.core.
+
+Compares the table-driven helpers against the previous string-formatting
+implementation for 1-, 4- and 64-byte inputs.
+
+    python benchmarks/bench_codec.py
+"""
+
+import os
+import sys
+import timeit
+
+# run from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyinterface import core
+
+
+# previous implementation
+# -----------------------
+
+def bytes2bit(bytes_data):
+    return ''.join([format(byte, '08b')[::-1] for byte in bytes_data])
+
+def bit2bytes(bit_str):
+    bit_str += ('0' * ((8 - len(bit_str)) % 8))
+    d = b''
+    for i in range(int(len(bit_str)/8)):
+        bb = bit_str[8*i:8*(i+1)]
+        d += int(bb[::-1], 2).to_bytes(1, 'little')
+        continue
+    return  d
+
+def bytes2list(bytes_data):
+    return list(map(int, bytes2bit(bytes_data)))
+
+def list2bytes(bit_list):
+    bit_str = ''.join(map(str, bit_list))
+    return bit2bytes(bit_str)
+
+
+def bench(func, arg, number):
+    t = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return t / number * 1e6
+
+
+def main():
+    number = 20000
+    print('{0:<12s} {1:>6s} {2:>10s} {3:>10s} {4:>8s}'.format(
+        'function', 'bytes', 'old [us]', 'new [us]', 'speedup'))
+    
+    for size in [1, 4, 64]:
+        data = os.urandom(size)
+        cases = [
+            ('bytes2bit', bytes2bit, core.bytes2bit, data),
+            ('bit2bytes', bit2bytes, core.bit2bytes, bytes2bit(data)),
+            ('bytes2list', bytes2list, core.bytes2list, data),
+            ('list2bytes', list2bytes, core.list2bytes, bytes2list(data)),
+        ]
+        for name, old, new, arg in cases:
+            assert old(arg) == new(arg)
+            t_old = bench(old, arg, number)
+            t_new = bench(new, arg, number)
+            print('{0:<12s} {1:>6d} {2:>10.3f} {3:>10.3f} {4:>7.1f}x'.format(
+                name, size, t_old, t_new, t_old / t_new))
+            continue
+        continue
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark of typed register field decoding.
+
+Compares core.register_field against the previous decoding paths:
+the string based two's complement of pci7415 (comp28/comp16) and the
+format-string struct.unpack of flagged_bytes.to_float. (The 3-byte PPMC
+counter of pci7204 keeps its bare int.from_bytes, which is faster than a
+field closure.)
+
+    python benchmarks/bench_fields.py
+"""
+
+import os
+import struct
+import sys
+import timeit
+
+# run from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyinterface import core
+from pyinterface import pci7415
+
+
+# previous implementation
+# -----------------------
+
+def from_comp28_format(x):
+    data = []
+    for i in x:
+        a = i.to_bit()[0:28][::-1]
+        b = -int(a[0]) << len(a) | int(a, 2)
+        data.append(b)
+    return data
+
+def from_comp16_format(x):
+    data = []
+    for i in x:
+        a = i.to_bit()[0:16][::-1]
+        b = -int(a[0]) << len(a) | int(a, 2)
+        data.append(b)
+    return data
+
+def to_float(d):
+    if len(d.bytes) == 2:
+        return d.unpack('<e')
+    if len(d.bytes) == 4:
+        return d.unpack('<f')
+    if len(d.bytes) == 8:
+        return d.unpack('<d')
+    return 0.0
+
+def bench(func, arg, number):
+    t = min(timeit.repeat(lambda: func(arg), number=number, repeat=5))
+    return t / number * 1e6
+
+
+def main():
+    number = 20000
+    axes = [core.flagged_bytes(os.urandom(4)) for _ in range(4)]
+    f4 = core.flagged_bytes(os.urandom(4))
+
+    cases = [
+        ('comp28 x4', from_comp28_format, pci7415.from_comp28_format, axes),
+        ('comp16 x4', from_comp16_format, pci7415.from_comp16_format, axes),
+        ('to_float', to_float, core.flagged_bytes.to_float, f4),
+    ]
+
+    print('{0:<14s} {1:>10s} {2:>10s} {3:>8s}'.format(
+        'decode', 'old [us]', 'new [us]', 'speedup'))
+    for name, old, new, arg in cases:
+        assert repr(old(arg)) == repr(new(arg))
+        t_old = bench(old, arg, number)
+        t_new = bench(new, arg, number)
+        print('{0:<14s} {1:>10.3f} {2:>10.3f} {3:>7.1f}x'.format(
+            name, t_old, t_new, t_old / t_new))
+        continue
+    return
+
+
+if __name__ == '__main__':
+    main()
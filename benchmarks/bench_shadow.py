@@ -0,0 +1,91 @@
+"""
+Construction time and memory of 16 simultaneously opened boards.
+
+Opens 16 simulated boards (pyinterface.sim) with BARs of the given size
+and reports the construction time, the memory allocated by the drivers
+(tracemalloc) and the process RSS, for the sparse shadow registers and
+for the previous full-BAR shadow bytearrays.
+
+    python benchmarks/bench_shadow.py [bar_size]
+"""
+
+import os
+import sys
+import time
+import tracemalloc
+
+import psutil
+
+# run from the repository root without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyinterface import core
+from pyinterface import sim
+from pyinterface import tools
+
+
+boards = [2724, 2702, 3177, 3346, 6204, 7204, 7415, 3165] * 2
+
+
+def full_bar_init(self, pci_config, backend=None):
+    # previous interface_driver.__init__: shadows sized to every BAR
+    self.backend = backend
+    self.config = pci_config
+    self.bar = pci_config.bar
+    self.log_bytes_in = [bytearray(bytes(_.size)) for _ in self.bar]
+    self.log_bytes_out = [bytearray(bytes(_.size)) for _ in self.bar]
+    self._shadow_valid = set()
+    self.board_id = self.get_board_id()
+    return
+
+
+def open_boards(backend):
+    return [tools.open(dev, i // 8, backend=backend, pool=False)
+            for i, dev in enumerate(boards)]
+
+
+def measure(backend):
+    proc = psutil.Process()
+    rss0 = proc.memory_info().rss
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    opened = open_boards(backend)
+    t1 = time.perf_counter()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss1 = proc.memory_info().rss
+    return opened, t1 - t0, current, rss1 - rss0
+
+
+def main():
+    bar_size = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+
+    backend = sim.sim_backend()
+    for i, dev in enumerate(boards):
+        nbar = len(sim.get_bar_sizes(sim.get_driver_class(dev)))
+        backend.add_board(dev, rsw=i//8, bar_sizes=[bar_size]*nbar)
+        continue
+
+    print('16 boards, BAR size {0} bytes'.format(bar_size))
+    print('{0:<10s} {1:>10s} {2:>12s} {3:>12s}'.format(
+        'shadow', 'open [ms]', 'alloc [kB]', 'RSS [kB]'))
+
+    open_boards(backend)    # warm up imports and caches
+    sparse = measure(backend)
+    print('{0:<10s} {1:>10.2f} {2:>12.1f} {3:>12.1f}'.format(
+        'sparse', sparse[1]*1e3, sparse[2]/1024, sparse[3]/1024))
+
+    init = core.interface_driver.__init__
+    core.interface_driver.__init__ = full_bar_init
+    try:
+        full = measure(backend)
+    finally:
+        core.interface_driver.__init__ = init
+        pass
+    print('{0:<10s} {1:>10.2f} {2:>12.1f} {3:>12.1f}'.format(
+        'full BAR', full[1]*1e3, full[2]/1024, full[3]/1024))
+    return
+
+
+if __name__ == '__main__':
+    main()
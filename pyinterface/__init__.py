@@ -1,18 +1,35 @@
-try:
-    from importlib.metadata import version
-except ImportError:
-    from importlib_metadata import version
-
-try:
-    __version__ = version("pyinterface")
-except:
-    __version__ = "0.0.0"
-
-
 interface_vendor_id = 0x1147
 
 
 from .tools import open
 from .tools import lspci
+from .tools import release
 from .core import interface_driver
 
+
+def __getattr__(name):
+    # __version__, profile and the board modules (pyinterface.pci2724, ...)
+    # are loaded on first access to keep "import pyinterface" fast
+    if name == '__version__':
+        try:
+            from importlib.metadata import version
+        except ImportError:
+            from importlib_metadata import version
+
+        global __version__
+        try:
+            __version__ = version("pyinterface")
+        except:
+            __version__ = "0.0.0"
+        return __version__
+
+    if name == 'profile':
+        from .profiler import profile
+        globals()['profile'] = profile
+        return profile
+
+    from . import tools
+    if name in tools.board_modules:
+        return getattr(tools, name)
+    msg = 'module {0!r} has no attribute {1!r}'.format(__name__, name)
+    raise AttributeError(msg)
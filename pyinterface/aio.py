@@ -0,0 +1,170 @@
+"""
+asyncio からボードを扱うためのラッパです。
+
+ボードごとに専用の I/O スレッド (executor) を 1 本持ち、ドライバのメソッドは
+そのスレッドで実行されます。同じボードを複数回 open しても executor は
+1 つです。ドライバ内部の time.sleep やポーリングは
+この I/O スレッドだけを止め、イベントループは止めません。
+レジスタの待ち (wait_until, wait_motion_stop) はイベントループ上で
+asyncio.sleep を使って待ちます。
+
+    >>> import pyinterface.aio
+    >>> async def main():
+    ...     b = await pyinterface.aio.open(2724, 0)
+    ...     d = await b.input_byte('IN1_8')
+    ...     await b.output_byte('OUT1_8', [1,0,0,0,0,0,0,0])
+    ...     await b.close()
+"""
+
+import time
+import asyncio
+import functools
+import threading
+import concurrent.futures
+
+from . import core
+from . import tools
+
+
+# executors of the pooled boards: id(board) -> [executor, number of
+# async_boards]; every open of the same pooled board shares one executor
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _acquire_executor(board, name):
+    with _executors_lock:
+        entry = _executors.get(id(board))
+        if entry is None:
+            entry = [concurrent.futures.ThreadPoolExecutor(1, name), 0]
+            _executors[id(board)] = entry
+            pass
+        entry[1] += 1
+        return entry[0]
+
+
+def _release_executor(board):
+    # returns the executor when the last async_board of board is closed
+    with _executors_lock:
+        entry = _executors[id(board)]
+        entry[1] -= 1
+        if entry[1] > 0:
+            return None
+        del _executors[id(board)]
+        return entry[0]
+
+
+async def open(board_name, board_id, backend=None):
+    name = 'pyinterface-{0}-{1}'.format(board_name, board_id)
+    loop = asyncio.get_running_loop()
+    board = await loop.run_in_executor(
+        None, tools.open, board_name, board_id, backend)
+    if board is None:
+        msg = 'board {0} (RSW={1}) is not found'.format(board_name, board_id)
+        raise TypeError(msg)
+    b = async_board(board, _acquire_executor(board, name))
+    b.pooled = True
+    return b
+
+
+class async_board(object):
+    # methods of the wrapped board (gpgXXXX or pciXXXX_driver) are
+    # returned as coroutine functions running on the board's executor
+
+    pooled = False      # close() releases the board to tools' pool
+    spin_time = 50e-6
+    min_sleep = 100e-6
+    max_sleep = 10e-3
+
+    def __init__(self, board, executor=None):
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(1, 'pyinterface')
+            pass
+        self.board = board
+        self.driver = getattr(board, 'driver', board)
+        self.board_id = board.board_id
+        self.executor = executor
+        pass
+
+    def __getattr__(self, name):
+        attr = getattr(self.board, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def method(*args, **kwargs):
+            return await self.call(attr, *args, **kwargs)
+        return method
+
+    async def call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self, bar_num, offset, size):
+        return await self.call(self.driver.read, bar_num, offset, size)
+
+    async def write(self, bar_num, offset, data):
+        return await self.call(self.driver.write, bar_num, offset, data)
+
+    async def wait_until(self, bar_num, offset, mask, value, timeout=1.0,
+                         size=1):
+        # same as interface_driver.wait_until, but sleeps on the event loop
+        # between polls; the register reads run on the executor
+        t0 = time.perf_counter()
+        spin_end = t0 + self.spin_time
+        deadline = t0 + timeout
+        sleep = self.min_sleep
+        polls = 0
+        while True:
+            d = await self.call(self.driver.read, bar_num, offset, size)
+            polls += 1
+            if int.from_bytes(d.bytes, 'little') & mask == value:
+                break
+            now = time.perf_counter()
+            if now >= deadline:
+                msg = 'timeout ({0} s, {1} polls) waiting for'.format(timeout, polls)
+                msg += ' BAR{0}+0x{1:02x} & 0x{2:x} == 0x{3:x}'.format(
+                    bar_num, offset, mask, value)
+                msg += ', last read 0x{0}'.format(d.to_hex())
+                raise core.WaitTimeoutError(msg)
+            if now >= spin_end:
+                await asyncio.sleep(min(sleep, deadline - now))
+                sleep = min(sleep * 2, self.max_sleep)
+            else:
+                await asyncio.sleep(0)
+                pass
+            continue
+        return time.perf_counter() - t0, polls
+
+    async def wait_motion_stop(self, axis, timeout=60):
+        # pci7415: waits for the main status busy bit of each axis
+        bar = 1
+        offset = 0x00
+        size = 2
+        t0 = time.perf_counter()
+        for i in self.driver._make_offset_list(offset, axis):
+            rest = max(timeout - (time.perf_counter() - t0), 0)
+            await self.wait_until(bar, i, 0x0001, 0x0000, rest, size)
+            continue
+        return
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        if not self.pooled:
+            await loop.run_in_executor(None, self.executor.shutdown)
+            return
+        self.pooled = False
+        executor = _release_executor(self.board)
+        if executor is not None:
+            await loop.run_in_executor(None, executor.shutdown)
+            pass
+        tools.release(self.board)
+        return
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+        return False
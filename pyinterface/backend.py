@@ -0,0 +1,60 @@
+"""
+ボードへのバスアクセスを行うバックエンドの選択を行います。
+
+バックエンドは pypci モジュールと同じ
+
+    lspci(vendor=None, device=None)
+    read(bar, offset, size)
+    write(bar, offset, data)
+
+を持つオブジェクトです。pypci（既定）、mmio.mmio_backend、
+sim.sim_backend が利用できます。
+"""
+
+_default_backend = None
+_mmio_backend = None
+
+
+def get_default_backend():
+    global _default_backend
+    if _default_backend is None:
+        import pypci
+        _default_backend = pypci
+        pass
+    return _default_backend
+
+
+def get_mmio_backend():
+    # one mmio_backend per process, so the BARs are mapped once and the
+    # per-backend caches (discovery, inventory) are shared
+    global _mmio_backend
+    if _mmio_backend is None:
+        from . import mmio
+        _mmio_backend = mmio.mmio_backend()
+        pass
+    return _mmio_backend
+
+
+def set_default_backend(backend):
+    global _default_backend
+    _default_backend = get_backend(backend)
+    return
+
+
+def get_backend(backend=None):
+    if backend is None:
+        return get_default_backend()
+
+    if backend == 'pypci':
+        import pypci
+        return pypci
+
+    if backend == 'mmio':
+        return get_mmio_backend()
+
+    if isinstance(backend, str):
+        msg = "backend must be 'pypci', 'mmio' or a backend object"
+        msg += ', not {0}'.format(backend)
+        raise ValueError(msg)
+
+    return backend
@@ -1,30 +1,387 @@
 
+import sys
+import time
+import json
 import struct
-import pypci
+import threading
+import contextlib
+import concurrent.futures
+from . import backend as _backend
+
+# numpy is imported on first use (it dominates the import time otherwise)
+numpy = None
+_numpy_found = None
+
+def _numpy():
+    global numpy, _numpy_found
+    if _numpy_found is None:
+        try:
+            import numpy
+            _numpy_found = True
+        except ImportError:
+            _numpy_found = False
+            pass
+        pass
+    return numpy
 
 
 # functions
 # ---------
 
+# 256-entry lookup tables (LSB-first bit order)
+_byte2bit = tuple(format(i, '08b')[::-1] for i in range(256))
+_ascii2list = bytes.maketrans(b'01', b'\x00\x01')
+_list2ascii = bytes([48, 49]) + b'x' * 254
+
+# inputs of at least this many bytes go through numpy, when available
+numpy_codec_threshold = 256
+
+def _unpackbits(bytes_data):
+    return numpy.unpackbits(numpy.frombuffer(bytes(bytes_data), numpy.uint8),
+                            bitorder='little')
+
 def bytes2bit(bytes_data):
-    return ''.join([format(byte, '08b')[::-1] for byte in bytes_data])
+    if (len(bytes_data) >= numpy_codec_threshold) and (_numpy() is not None):
+        return (_unpackbits(bytes_data) + 48).tobytes().decode('ascii')
+    return ''.join([_byte2bit[byte] for byte in bytes_data])
 
 def bit2bytes(bit_str):
     bit_str += ('0' * ((8 - len(bit_str)) % 8))
-    d = b''
-    for i in range(int(len(bit_str)/8)):
-        bb = bit_str[8*i:8*(i+1)]
-        d += int(bb[::-1], 2).to_bytes(1, 'little')
-        continue
-    return  d
+    return int(bit_str[::-1] or '0', 2).to_bytes(len(bit_str) // 8, 'little')
 
 def bytes2list(bytes_data):
-    return list(map(int, bytes2bit(bytes_data)))
+    if (len(bytes_data) >= numpy_codec_threshold) and (_numpy() is not None):
+        return _unpackbits(bytes_data).tolist()
+    return list(bytes2bit(bytes_data).encode('ascii').translate(_ascii2list))
 
 def list2bytes(bit_list):
+    np = sys.modules.get('numpy')
+    if (np is not None) and isinstance(bit_list, np.ndarray):
+        _numpy()
+        if ((bit_list == 0) | (bit_list == 1)).all():
+            return numpy.packbits(bit_list.astype(numpy.uint8),
+                                  bitorder='little').tobytes()
+        pass
+    
+    if type(bit_list) not in (list, tuple):
+        bit_list = tuple(bit_list)
+        pass
+    
+    try:
+        bit_str = bytes(bit_list).translate(_list2ascii).decode('ascii')
+        return bit2bytes(bit_str)
+    except (TypeError, ValueError):
+        pass
+    
     bit_str = ''.join(map(str, bit_list))
     return bit2bytes(bit_str)
 
+def list2int(bit_list):
+    # LSB-first bits -> int
+    if type(bit_list) in (list, tuple):
+        try:
+            d = bytes(bit_list[::-1]).translate(_list2ascii)
+            return int(d or b'0', 2)
+        except (TypeError, ValueError):
+            pass
+        pass
+    return int.from_bytes(list2bytes(bit_list), 'little')
+
+def compile_bit_flags(bit_flags):
+    # index : flag name -> ((bar_num, offset, bitmask), ...)
+    # masks : masks[bar_num][offset] -> {flag name: bitmask}
+    index = {}
+    masks = []
+    for bar_num, bar_flags in enumerate(bit_flags):
+        bar_masks = []
+        for offset, flag_list in enumerate(bar_flags):
+            reg = {}
+            for i, f in enumerate(flag_list):
+                if f == '': continue
+                reg[f] = reg.get(f, 0) | (1 << i)
+                continue
+            for f, mask in reg.items():
+                index.setdefault(f, []).append((bar_num, offset, mask))
+                continue
+            bar_masks.append(reg)
+            continue
+        masks.append(tuple(bar_masks))
+        continue
+    index = {f: tuple(pos) for f, pos in index.items()}
+    return index, tuple(masks)
+
+
+def new_shadow(bit_flags, num_bar):
+    # shadow registers of each BAR, sized to the registers declared in
+    # bit_flags; shadow_store() extends them on first touch beyond that.
+    return [bytearray(len(bit_flags[i]) if i < len(bit_flags) else 0)
+            for i in range(num_bar)]
+
+def shadow_store(shadow, offset, data):
+    end = offset + len(data)
+    if end > len(shadow):
+        shadow.extend(bytes(end - len(shadow)))
+        pass
+    shadow[offset:end] = data
+    return
+
+_point_masks = {}
+
+def point_mask(start, num):
+    # bit mask of the points start, ..., start+num-1 (1-origin)
+    key = (start, num)
+    m = _point_masks.get(key)
+    if m is None:
+        m = ((1 << num) - 1) << (start - 1)
+        _point_masks[key] = m
+        pass
+    return m
+
+_aligned_spans = {}
+
+def aligned_span(lo, hi):
+    # smallest naturally aligned 1, 2, 4, 8, ... byte span [start, stop)
+    # holding the bytes lo..hi
+    key = (lo, hi)
+    span = _aligned_spans.get(key)
+    if span is None:
+        w = 1
+        while (lo // w) != (hi // w):
+            w *= 2
+            continue
+        span = (lo - lo % w, lo - lo % w + w)
+        _aligned_spans[key] = span
+        pass
+    return span
+
+def shadow_load(shadow, offset, size):
+    d = shadow[offset:offset+size]
+    if len(d) < size:
+        d += bytes(size - len(d))
+        pass
+    return d
+
+
+_int_codes = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+_float_structs = {
+    2: struct.Struct('<e'),
+    4: struct.Struct('<f'),
+    8: struct.Struct('<d'),
+}
+
+class register_field(object):
+    # typed register field: 'width' bytes (little endian) at 'offset',
+    # optionally only the bit range bits=(lsb, nbits) of them, as a
+    # signed/unsigned int or an IEEE float, multiplied by 'scale'.
+    # The decoder is compiled once:
+    #   decode(data)          -> value of data[0:width]
+    #   decode_from(buf, pos) -> value of buf[pos:pos+width]
+    #   encode(value)         -> bytes (other bits of a bit range are 0)
+    
+    __slots__ = ('name', 'offset', 'width', 'signed', 'bits', 'scale',
+                 'is_float', 'struct', 'decode_from', 'decode', 'encode')
+    
+    def __init__(self, offset=0, width=4, signed=False, bits=None,
+                 scale=None, is_float=False, name=''):
+        self.name = name
+        self.offset = offset
+        self.width = width
+        self.signed = signed
+        self.bits = bits
+        self.scale = scale
+        self.is_float = is_float
+        self.struct = None
+        self._compile()
+        pass
+    
+    def __repr__(self):
+        return ('<register_field {0!r} offset={1} width={2} signed={3}'
+                ' bits={4} scale={5}>').format(
+                    self.name, self.offset, self.width, self.signed,
+                    self.bits, self.scale)
+    
+    def _compile(self):
+        width = self.width
+        signed = self.signed
+        scale = self.scale
+        
+        if self.is_float:
+            st = _float_structs[width]
+            unpack_from = st.unpack_from
+            def raw_from(buf, pos=0):
+                return unpack_from(buf, pos)[0]
+            def raw_encode(value):
+                return st.pack(value)
+            self.struct = st
+            
+        elif self.bits is None:
+            code = _int_codes.get(width)
+            if code is not None:
+                if not signed: code = code.upper()
+                st = struct.Struct('<' + code)
+                unpack_from = st.unpack_from
+                def raw_from(buf, pos=0):
+                    return unpack_from(buf, pos)[0]
+                def raw_encode(value):
+                    return st.pack(value)
+                self.struct = st
+            elif signed:
+                def raw_from(buf, pos=0):
+                    return int.from_bytes(buf[pos:pos+width], 'little',
+                                          signed=True)
+                def raw_encode(value):
+                    return value.to_bytes(width, 'little', signed=True)
+            else:
+                def raw_from(buf, pos=0):
+                    return int.from_bytes(buf[pos:pos+width], 'little')
+                def raw_encode(value):
+                    return value.to_bytes(width, 'little')
+                pass
+            
+        else:
+            lsb, nbits = self.bits
+            mask = (1 << nbits) - 1
+            sign = 1 << (nbits - 1)
+            code = _int_codes.get(width)
+            if code is not None:
+                st = struct.Struct('<' + code.upper())
+                unpack_from = st.unpack_from
+                self.struct = st
+                if signed:
+                    def raw_from(buf, pos=0):
+                        return (((unpack_from(buf, pos)[0] >> lsb) & mask)
+                                ^ sign) - sign
+                else:
+                    def raw_from(buf, pos=0):
+                        return (unpack_from(buf, pos)[0] >> lsb) & mask
+                    pass
+            elif signed:
+                def raw_from(buf, pos=0):
+                    word = int.from_bytes(buf[pos:pos+width], 'little')
+                    return (((word >> lsb) & mask) ^ sign) - sign
+            else:
+                def raw_from(buf, pos=0):
+                    word = int.from_bytes(buf[pos:pos+width], 'little')
+                    return (word >> lsb) & mask
+                pass
+            def raw_encode(value):
+                return ((value & mask) << lsb).to_bytes(width, 'little')
+            pass
+        
+        if scale is None:
+            self.decode_from = raw_from
+            self.encode = raw_encode
+        else:
+            def decode_from(buf, pos=0):
+                return raw_from(buf, pos) * scale
+            def encode(value):
+                value = value / scale
+                if not self.is_float: value = int(round(value))
+                return raw_encode(value)
+            self.decode_from = decode_from
+            self.encode = encode
+            pass
+        self.decode = self.decode_from
+        return
+
+
+_null_lock = contextlib.nullcontext()
+
+
+class WaitTimeoutError(Exception):
+    pass
+
+
+# save_state() data: header (magic, format, length of the JSON part),
+# the JSON part (driver, board, shadow sizes, attributes) and the shadow
+# bytes (log_bytes_in, then log_bytes_out, BAR by BAR)
+_state_header = struct.Struct('<8sHI')
+_state_magic = b'PYIFSTAT'
+
+def state_value_to_json(value):
+    # attribute value -> JSON value; tuples, bytes and dicts are tagged
+    # so that they come back as they were (dict keys need not be str)
+    if (value is None) or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, list):
+        return [state_value_to_json(_) for _ in value]
+    elif isinstance(value, tuple):
+        return {'tuple': [state_value_to_json(_) for _ in value]}
+    elif isinstance(value, (bytes, bytearray)):
+        return {'bytes': bytes(value).hex()}
+    elif isinstance(value, dict):
+        return {'dict': [[state_value_to_json(k), state_value_to_json(v)]
+                         for k, v in value.items()]}
+    msg = 'state value of type {0} is not supported'.format(type(value).__name__)
+    raise TypeError(msg)
+
+def state_value_from_json(value):
+    if isinstance(value, list):
+        return [state_value_from_json(_) for _ in value]
+    elif not isinstance(value, dict):
+        return value
+    elif list(value) == ['tuple']:
+        return tuple(state_value_from_json(_) for _ in value['tuple'])
+    elif list(value) == ['bytes']:
+        return bytes.fromhex(value['bytes'])
+    elif list(value) == ['dict']:
+        return {_hashable(state_value_from_json(k)): state_value_from_json(v)
+                for k, v in value['dict']}
+    raise ValueError('broken state value: {0!r}'.format(value))
+
+def _hashable(key):
+    if isinstance(key, list):
+        raise ValueError('broken state value: list as a dict key')
+    return key
+
+def encode_state(state):
+    # save_state() dict -> bytes
+    log_in, log_out, valid = state['shadow']
+    meta = dict(state)
+    meta['shadow'] = {
+        'in': [len(_) for _ in log_in],
+        'out': [len(_) for _ in log_out],
+        'valid': sorted(valid),
+    }
+    meta['attributes'] = {name: state_value_to_json(value)
+                          for name, value in state['attributes'].items()}
+    meta = json.dumps(meta, sort_keys=True).encode()
+    header = _state_header.pack(_state_magic, state['format'], len(meta))
+    return b''.join((header, meta) + tuple(log_in) + tuple(log_out))
+
+def decode_state(data):
+    # bytes -> save_state() dict, or None if data is not state data of
+    # a known format; raises ValueError if it is broken
+    if len(data) < _state_header.size:
+        return None
+    magic, fmt, meta_size = _state_header.unpack_from(data)
+    if magic != _state_magic:
+        return None
+    offset = _state_header.size
+    try:
+        state = json.loads(bytes(data[offset:offset+meta_size]).decode())
+    except (UnicodeDecodeError, ValueError):
+        raise ValueError('broken state data')
+    offset += meta_size
+    state['format'] = fmt
+    
+    shadow = []
+    for sizes in (state['shadow']['in'], state['shadow']['out']):
+        logs = []
+        for size in sizes:
+            logs.append(bytes(data[offset:offset+size]))
+            offset += size
+            continue
+        shadow.append(tuple(logs))
+        continue
+    if offset != len(data):
+        raise ValueError('broken state data')
+    valid = frozenset((bar_num, o) for bar_num, o in state['shadow']['valid'])
+    state['shadow'] = (shadow[0], shadow[1], valid)
+    state['attributes'] = {name: state_value_from_json(value)
+                           for name, value in state['attributes'].items()}
+    return state
+
 
 # class
 # -----
@@ -33,60 +390,453 @@ class interface_driver(object):
     config = None
     board_id = -1
     
-    bar = []
+    bar = ()
     bit_flags_in = ()
     bit_flags_out = ()
-    log_bytes_in = []
-    log_bytes_out = []
+    log_bytes_in = ()
+    log_bytes_out = ()
+    
+    flag_index_in = {}
+    flag_index_out = {}
+    _flag_masks_in = ()
+    _flag_masks_out = ()
+    _flag_bytes_cache = {}
+    
+    # registers listed here as (bar_num, offset) are written even when the
+    # shadow says the write is redundant (strobes, command ports, FIFOs, ...)
+    suppress_redundant_writes = False
+    always_write_registers = frozenset()
+    
+    _transaction = None
+    
+    # object providing read(bar, offset, size) and write(bar, offset, data)
+    # for the bus access (see backend.py); None selects the default (pypci)
+    backend = None
+    
+    # trace.access_tracer recording the bus accesses, or None
+    tracer = None
+    
+    # save_state()/restore_state(): driver attributes saved with the
+    # shadow, and (bar_num, offset, size) of output registers that read
+    # back what was written, checked against the saved shadow on restore
+    # (see verify_state())
+    state_attributes = ()
+    readback_registers = ()
+    state_format = 2
+    state_restored = False
+    
+    # one RLock per BAR when set_thread_safe() is enabled, else None
+    _bar_locks = None
+    
+    # lock file descriptor while the shadow is in shared memory (shm.py),
+    # and the BAR locks to put back when it leaves shared memory
+    _shm_fd = None
+    _shm_saved_locks = None
     
-    def __init__(self, pci_config):
+    # wait_until(): busy-poll this long [s], then sleep with exponential
+    # backoff from wait_min_sleep up to wait_max_sleep between polls
+    wait_spin_time = 50e-6
+    wait_min_sleep = 10e-6
+    wait_max_sleep = 1e-3
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.flag_index_in, cls._flag_masks_in = compile_bit_flags(cls.bit_flags_in)
+        cls.flag_index_out, cls._flag_masks_out = compile_bit_flags(cls.bit_flags_out)
+        cls._flag_bytes_cache = {}
+        return
+    
+    def __init__(self, pci_config, backend=None):
+        if (backend is not None) or (self.backend is None):
+            self.backend = _backend.get_backend(backend)
+            pass
         self.config = pci_config
         self.bar = pci_config.bar
-        self.log_bytes_in = [bytearray(bytes(_.size)) for _ in self.bar]
-        self.log_bytes_out = [bytearray(bytes(_.size)) for _ in self.bar]
+        self.log_bytes_in = new_shadow(self.bit_flags_in, len(self.bar))
+        self.log_bytes_out = new_shadow(self.bit_flags_out, len(self.bar))
+        self._shadow_valid = set()
         self.board_id = self.get_board_id()
         pass
     
     def read(self, bar_num, offset, size):
-        bar = self.bar[bar_num]
-        ret = pypci.read(bar, offset, size)
-        self.log_bytes_in[bar_num][offset:offset+size] = ret
+        if self._bar_locks is None:
+            return self._read(bar_num, offset, size)
+        with self._bar_locks[bar_num]:
+            return self._read(bar_num, offset, size)
+    
+    def _read(self, bar_num, offset, size):
+        if self._transaction is not None:
+            self._transaction.flush()
+            pass
+        ret = self._bus_read(bar_num, offset, size)
+        shadow_store(self.log_bytes_in[bar_num], offset, ret)
         flag = self.bit_flags_in[bar_num][offset:offset+size]
         fb = flagged_bytes(ret, flag)
         return fb
     
+    def read_into(self, bar_num, offset, buf, pos=0, size=None, log=True):
+        # reads size bytes (default: to the end of buf) into buf[pos:],
+        # buf being a bytearray, memoryview, numpy array, ...
+        if self._bar_locks is None:
+            return self._read_into(bar_num, offset, buf, pos, size, log)
+        with self._bar_locks[bar_num]:
+            return self._read_into(bar_num, offset, buf, pos, size, log)
+    
+    def _read_into(self, bar_num, offset, buf, pos, size, log):
+        if self._transaction is not None:
+            self._transaction.flush()
+            pass
+        dst = memoryview(buf).cast('B')
+        if size is None:
+            size = len(dst) - pos
+            pass
+        self._bus_read_into(bar_num, offset, dst, pos, size)
+        if log:
+            shadow_store(self.log_bytes_in[bar_num], offset, dst[pos:pos+size])
+            pass
+        return size
+    
     def write(self, bar_num, offset, data):
+        if self._bar_locks is None:
+            return self._write(bar_num, offset, data)
+        with self._bar_locks[bar_num]:
+            return self._write(bar_num, offset, data)
+    
+    def _write(self, bar_num, offset, data):
         size = len(data)
-        bar = self.bar[bar_num]
-        pypci.write(bar, offset, data)
-        self.log_bytes_out[bar_num][offset:offset+size] = data
+        if self.suppress_redundant_writes:
+            if self._is_redundant_write(bar_num, offset, data):
+                return
+            self._shadow_valid.update([(bar_num, o) for o
+                                       in range(offset, offset+size)])
+            pass
+        if self._transaction is not None:
+            self._transaction.write(bar_num, offset, data)
+            shadow_store(self.log_bytes_out[bar_num], offset, data)
+            return
+        self._bus_write(bar_num, offset, data)
+        shadow_store(self.log_bytes_out[bar_num], offset, data)
         return
     
-    def set_flag(self, bar_num, offset, flag):
-        bar = self.bar[bar_num]
-        flag_list = self.bit_flags_out[bar_num][offset]
-        flags = flag.split()
-        
-        bit = ''
-        for f in flag_list:
-            if f in flags:
-                bit += '1'
-            else:
-                bit += '0'
+    def _bus_read(self, bar_num, offset, size):
+        if self.tracer is None:
+            return self.backend.read(self.bar[bar_num], offset, size)
+        t0 = time.perf_counter_ns()
+        ret = self.backend.read(self.bar[bar_num], offset, size)
+        elapsed = time.perf_counter_ns() - t0
+        self.tracer.record(self, 'read', bar_num, offset, ret, elapsed)
+        return ret
+    
+    def _bus_read_into(self, bar_num, offset, dst, pos, size):
+        if self.tracer is not None:
+            t0 = time.perf_counter_ns()
+            pass
+        read_into = getattr(self.backend, 'read_into', None)
+        if read_into is None:
+            dst[pos:pos+size] = self.backend.read(self.bar[bar_num], offset, size)
+        else:
+            read_into(self.bar[bar_num], offset, dst, pos, size)
+            pass
+        if self.tracer is not None:
+            elapsed = time.perf_counter_ns() - t0
+            self.tracer.record(self, 'read', bar_num, offset,
+                               dst[pos:pos+size], elapsed)
+            pass
+        return
+    
+    def _bus_write(self, bar_num, offset, data):
+        if self.tracer is None:
+            self.backend.write(self.bar[bar_num], offset, data)
+            return
+        t0 = time.perf_counter_ns()
+        self.backend.write(self.bar[bar_num], offset, data)
+        elapsed = time.perf_counter_ns() - t0
+        self.tracer.record(self, 'write', bar_num, offset, data, elapsed)
+        return
+    
+    def transaction(self):
+        return register_transaction(self)
+    
+    def read_field(self, bar_num, field, base=0):
+        # reads and decodes a register_field at base + field.offset
+        d = self.read(bar_num, base + field.offset, field.width)
+        return field.decode(d.bytes)
+    
+    def write_field(self, bar_num, field, value, base=0):
+        self.write(bar_num, base + field.offset, field.encode(value))
+        return
+    
+    def wait_until(self, bar_num, offset, mask, value, timeout=1.0, size=1):
+        # polls until (register & mask) == value and returns
+        # (elapsed time [s], number of polls); raises WaitTimeoutError
+        with self.lock(bar_num):
+            if self._transaction is not None:
+                self._transaction.flush()
+                pass
+            pass
+        t0 = time.perf_counter()
+        spin_end = t0 + self.wait_spin_time
+        deadline = t0 + timeout
+        sleep = self.wait_min_sleep
+        polls = 0
+        while True:
+            with self.lock(bar_num):
+                d = self._bus_read(bar_num, offset, size)
+                pass
+            polls += 1
+            if int.from_bytes(d, 'little') & mask == value:
+                break
+            now = time.perf_counter()
+            if now >= deadline:
+                msg = 'timeout ({0} s, {1} polls) waiting for'.format(timeout, polls)
+                msg += ' BAR{0}+0x{1:02x} & 0x{2:x} == 0x{3:x}'.format(
+                    bar_num, offset, mask, value)
+                msg += ', last read 0x{0}'.format(d.hex())
+                raise WaitTimeoutError(msg)
+            if now >= spin_end:
+                time.sleep(min(sleep, deadline - now))
+                sleep = min(sleep * 2, self.wait_max_sleep)
                 pass
             continue
-        
-        d = bit2bytes(bit)
+        elapsed = time.perf_counter() - t0
+        shadow_store(self.log_bytes_in[bar_num], offset, d)
+        return elapsed, polls
+    
+    def set_thread_safe(self, enable=True):
+        # per-BAR locks: accesses to one BAR are serialized, different
+        # BARs run in parallel. Transactions hold every BAR lock.
+        if enable and (self._bar_locks is None):
+            self._bar_locks = [threading.RLock() for _ in self.bar]
+        elif not enable:
+            if self._shm_fd is not None:
+                raise RuntimeError('shared shadow requires the BAR locks')
+            self._bar_locks = None
+            pass
+        return
+    
+    def set_shared_shadow(self, enable=True, unlink=False):
+        # moves the shadow into shared memory keyed by the BAR addresses,
+        # shared by every process opening the board; the BAR locks then
+        # also lock across processes. unlink removes the segments on disable.
+        from . import shm
+        if enable and (self._shm_fd is None):
+            shm.share_shadow(self)
+        elif (not enable) and (self._shm_fd is not None):
+            shm.unshare_shadow(self, unlink)
+            pass
+        return
+    
+    def lock(self, *bar_nums):
+        # context manager holding the locks of bar_nums (all BARs if
+        # none is given); does nothing unless set_thread_safe() is on
+        if self._bar_locks is None:
+            return _null_lock
+        if len(bar_nums) == 1:
+            return self._bar_locks[bar_nums[0]]
+        if bar_nums == ():
+            bar_nums = range(len(self._bar_locks))
+            pass
+        stack = contextlib.ExitStack()
+        for b in sorted(set(bar_nums)):
+            stack.enter_context(self._bar_locks[b])
+            continue
+        return stack
+    
+    def read_modify_write(self, bar_num, offset, size, func):
+        # writes func(current bytes) back, the current value being taken
+        # from the output shadow (log_bytes_out), atomically per BAR
+        with self.lock(bar_num):
+            old = bytes(shadow_load(self.log_bytes_out[bar_num], offset, size))
+            new = func(old)
+            self.write(bar_num, offset, new)
+            pass
+        return new
+    
+    def update_bits(self, bar_num, offset, size, mask, value):
+        mask &= (1 << (8 * size)) - 1
+        def func(old):
+            old = int.from_bytes(old, 'little')
+            new = (old & ~mask) | (value & mask)
+            return new.to_bytes(size, 'little')
+        return self.read_modify_write(bar_num, offset, size, func)
+    
+    def update_bits_span(self, bar_num, offset, size, mask, value):
+        # update_bits() writing only the aligned byte/word/dword span of the
+        # bytes that change (of mask if none does); returns the new value
+        mask &= (1 << (8 * size)) - 1
+        with self.lock(bar_num):
+            old = shadow_load(self.log_bytes_out[bar_num], offset, size)
+            old = int.from_bytes(old, 'little')
+            new = (old & ~mask) | (value & mask)
+            diff = (old ^ new) or mask
+            if diff == 0:
+                return new
+            start, stop = aligned_span(((diff & -diff).bit_length() - 1) >> 3,
+                                       (diff.bit_length() - 1) >> 3)
+            d = new.to_bytes(size, 'little')[start:stop]
+            self.write(bar_num, offset + start, d)
+            pass
+        return new
+    
+    def find_flag(self, name, in_out='out'):
+        # ((bar_num, offset, bitmask), ...) of the registers holding the flag
+        if in_out == 'in':
+            return self.flag_index_in.get(name, ())
+        elif in_out == 'out':
+            return self.flag_index_out.get(name, ())
+        raise ValueError("in_out must be 'in' or 'out'")
+    
+    def update_flags(self, bar_num, offset, set_flags='', clear_flags=''):
+        # sets/clears the named bits of an output register, keeping others
+        masks = self._flag_masks_out[bar_num][offset]
+        size = (len(self.bit_flags_out[bar_num][offset]) + 7) // 8
+        set_mask = 0
+        for f in set_flags.split():
+            set_mask |= masks.get(f, 0)
+            continue
+        clear_mask = 0
+        for f in clear_flags.split():
+            clear_mask |= masks.get(f, 0)
+            continue
+        return self.update_bits(bar_num, offset, size,
+                                set_mask | clear_mask, set_mask)
+    
+    def set_write_suppression(self, enable=True, always_write=()):
+        if enable and not self.suppress_redundant_writes:
+            self._shadow_valid = set()
+            pass
+        self.suppress_redundant_writes = enable
+        self.always_write_registers = (self.always_write_registers
+                                       | frozenset(always_write))
+        return
+    
+    def _is_redundant_write(self, bar_num, offset, data):
+        size = len(data)
+        for o in range(offset, offset+size):
+            if (bar_num, o) in self.always_write_registers:
+                return False
+            if (bar_num, o) not in self._shadow_valid:
+                return False
+            continue
+        return self.log_bytes_out[bar_num][offset:offset+size] == data
+    
+    def set_flag(self, bar_num, offset, flag):
+        key = (bar_num, offset, flag)
+        d = self._flag_bytes_cache.get(key)
+        if d is None:
+            d = self._encode_flag(bar_num, offset, flag)
+            self._flag_bytes_cache[key] = d
+            pass
+        if self.tracer is not None:
+            self.tracer.record(self, 'set_flag', bar_num, offset, d, None)
+            pass
         self.write(bar_num, offset, d)
         return
     
+    def _encode_flag(self, bar_num, offset, flag):
+        masks = self._flag_masks_out[bar_num][offset]
+        size = (len(self.bit_flags_out[bar_num][offset]) + 7) // 8
+        value = 0
+        for f in flag.split():
+            value |= masks.get(f, 0)
+            continue
+        return value.to_bytes(size, 'little')
+    
+    def snapshot_shadow(self):
+        return (tuple(bytes(_) for _ in self.log_bytes_in),
+                tuple(bytes(_) for _ in self.log_bytes_out),
+                frozenset(self._shadow_valid))
+    
+    def restore_shadow(self, snapshot):
+        log_in, log_out, valid = snapshot
+        if self._shm_fd is not None:
+            # keep the shared segments, copy into them
+            with self.lock():
+                for shadow, d in zip(self.log_bytes_in + self.log_bytes_out,
+                                     log_in + log_out):
+                    shadow[0:len(d)] = d
+                    continue
+                pass
+        else:
+            self.log_bytes_in = [bytearray(_) for _ in log_in]
+            self.log_bytes_out = [bytearray(_) for _ in log_out]
+            pass
+        self._shadow_valid = set(valid)
+        return
+    
+    def save_state(self, path=None):
+        # shadow + driver state as bytes (encode_state); written to path
+        # if given
+        state = {
+            'format': self.state_format,
+            'driver': type(self).__name__,
+            'board_id': self.board_id,
+            'bar_size': [_.size for _ in self.bar],
+            'shadow': self.snapshot_shadow(),
+            'suppress_redundant_writes': self.suppress_redundant_writes,
+            'attributes': {name: getattr(self, name)
+                           for name in self.state_attributes},
+        }
+        data = encode_state(state)
+        if path is not None:
+            with open(path, 'wb') as f:
+                f.write(data)
+                pass
+            pass
+        return data
+    
+    def verify_state(self, state):
+        # True when the live hardware still holds the decoded save_state()
+        # data: the readback_registers must match the saved shadow. A
+        # driver with nothing to read back cannot tell a configured board
+        # from a reset one, so its state is never verified
+        if not self.readback_registers:
+            return False
+        log_out = state['shadow'][1]
+        for bar_num, offset, size in self.readback_registers:
+            live = self._bus_read(bar_num, offset, size)
+            if live != shadow_load(log_out[bar_num], offset, size):
+                return False
+            continue
+        return True
+    
+    def restore_state(self, data, verify=True):
+        # restores save_state() data (bytes or a path) and returns True, or
+        # returns False leaving the driver untouched when the data is for
+        # another board or, with verify, verify_state() fails
+        if isinstance(data, str):
+            with open(data, 'rb') as f:
+                data = f.read()
+                pass
+            pass
+        state = decode_state(data)
+        if (state is None) or (state['format'] != self.state_format):
+            return False
+        if state['driver'] != type(self).__name__:
+            return False
+        if state['board_id'] != self.board_id:
+            return False
+        if state['bar_size'] != [_.size for _ in self.bar]:
+            return False
+        
+        if verify and not self.verify_state(state):
+            return False
+        
+        self.restore_shadow(state['shadow'])
+        self.suppress_redundant_writes = state['suppress_redundant_writes']
+        for name, value in state['attributes'].items():
+            setattr(self, name, value)
+            continue
+        self.state_restored = True
+        return True
+    
     def get_log(self, in_out, bar_num, offset):
         if in_out == 'in':
-            d = self.log_bytes_in[bar_num][offset:offset+1]
+            d = shadow_load(self.log_bytes_in[bar_num], offset, 1)
             f = self.bit_flags_in[bar_num][offset:offset+1]
             
         elif in_out == 'out':            
-            d = self.log_bytes_out[bar_num][offset:offset+1]
+            d = shadow_load(self.log_bytes_out[bar_num], offset, 1)
             f = self.bit_flags_out[bar_num][offset:offset+1]
         
         else:
@@ -102,22 +852,144 @@ class interface_driver(object):
 
 
 
+class register_transaction(object):
+    # Queues register accesses and issues them when the outermost
+    # ``with driver.transaction():`` block exits (or on flush()).
+    #
+    # Consecutive accesses of the same kind on the same BAR are merged when
+    # the new range starts inside, or right after, the queued one, so the
+    # bus order stays ascending. Accesses touching a byte of the driver's
+    # always_write_registers are never merged with another access.
+    # driver.write() calls are queued, driver.read() flushes the queue and
+    # reads immediately, and transaction.read() is deferred and returns a
+    # concurrent.futures.Future of the flagged_bytes.
+    
+    def __init__(self, driver):
+        self.driver = driver
+        self.ops = []
+        self._outer = None
+        self._lock = None
+        pass
+    
+    def __enter__(self):
+        self._lock = self.driver.lock()
+        self._lock.__enter__()
+        if self.driver._transaction is not None:
+            self._outer = self.driver._transaction
+            return self._outer
+        self.driver._transaction = self
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if self._outer is not None:
+                self._outer = None
+                return False
+            try:
+                self.flush()
+            finally:
+                self.driver._transaction = None
+                pass
+        finally:
+            self._lock.__exit__(None, None, None)
+            pass
+        return False
+    
+    def _mergeable(self, kind, bar_num, offset, size):
+        if self.ops == []:
+            return False
+        last = self.ops[-1]
+        if (last[0] != kind) or (last[1] != bar_num):
+            return False
+        start = last[2]
+        stop = start + last[3]
+        if not (start <= offset <= stop):
+            return False
+        volatile = self.driver.always_write_registers
+        for o in range(start, max(stop, offset+size)):
+            if (bar_num, o) in volatile:
+                return False
+            continue
+        return True
+    
+    def write(self, bar_num, offset, data):
+        size = len(data)
+        if self._mergeable('w', bar_num, offset, size):
+            last = self.ops[-1]
+            pos = offset - last[2]
+            last[4][pos:pos+size] = data
+            last[3] = len(last[4])
+            return
+        self.ops.append(['w', bar_num, offset, size, bytearray(data)])
+        return
+    
+    def read(self, bar_num, offset, size):
+        future = concurrent.futures.Future()
+        if self._mergeable('r', bar_num, offset, size):
+            last = self.ops[-1]
+            last[3] = max(last[3], offset + size - last[2])
+            last[4].append((future, offset, size))
+            return future
+        self.ops.append(['r', bar_num, offset, size, [(future, offset, size)]])
+        return future
+    
+    def flush(self):
+        ops, self.ops = self.ops, []
+        driver = self.driver
+        for i, (kind, bar_num, offset, size, data) in enumerate(ops):
+            try:
+                if kind == 'w':
+                    driver._bus_write(bar_num, offset, bytes(data))
+                    continue
+                ret = driver._bus_read(bar_num, offset, size)
+            except BaseException as e:
+                for op in ops[i:]:
+                    if op[0] != 'r': continue
+                    [f.set_exception(e) for f, _, _ in op[4]]
+                    continue
+                raise
+            
+            shadow_store(driver.log_bytes_in[bar_num], offset, ret)
+            for future, start, length in data:
+                pos = start - offset
+                flag = driver.bit_flags_in[bar_num][start:start+length]
+                future.set_result(flagged_bytes(ret[pos:pos+length], flag))
+                continue
+            continue
+        return
+
+
+_flag_positions_cache = {}
+
+def flag_positions(bit_flag):
+    # bit_flag -> (flat flag names, {flag name: first bit position})
+    try:
+        return _flag_positions_cache[bit_flag]
+    except KeyError:
+        pass
+    except TypeError:
+        bit_flag = tuple(tuple(flags) for flags in bit_flag)
+        return flag_positions(bit_flag)
+    
+    flat = tuple(f for flags in bit_flag for f in flags)
+    positions = {}
+    for i, f in enumerate(flat):
+        positions.setdefault(f, i)
+        continue
+    ret = (flat, positions)
+    _flag_positions_cache[bit_flag] = ret
+    return ret
+
+
 class flagged_bytes(object):
-    bytes = b''
-    bit_flag = ()
-    fmt = ''
+    __slots__ = ('bytes', 'bit_flag', 'fmt', '_value', '_flags')
     
     def __init__(self, bytes, bit_flag=(), fmt=''):
         self.bytes = bytes
-        
-        if bit_flag != ():
-            self.bit_flag = bit_flag
-            pass
-            
-        if fmt != '':
-            self.fmt = fmt
-            pass
-        
+        self.bit_flag = bit_flag
+        self.fmt = fmt
+        self._value = None
+        self._flags = None
         pass
         
     def __repr__(self):
@@ -126,18 +998,32 @@ class flagged_bytes(object):
     
     def __getitem__(self, key):
         if isinstance(key, str):
-            dictlist = self.to_dictlist()
-            for item in self.to_dictlist():
-                if item['flag'] == key: 
-                    return item['value']
-                continue
-            return None
+            pos = self._positions()[1].get(key)
+            if (pos is None) or (pos >= len(self.bytes) * 8):
+                return None
+            return (self._int() >> pos) & 1
+        
+        if type(key) is int and 0 <= key < len(self.bytes) * 8:
+            return (self._int() >> key) & 1
         
         bit = self.to_list()
         return bit[key]
+    
+    def _int(self):
+        if self._value is None:
+            self._value = int.from_bytes(self.bytes, 'little')
+            pass
+        return self._value
+    
+    def _positions(self):
+        if self._flags is None:
+            self._flags = flag_positions(self.bit_flag)
+            pass
+        return self._flags
         
     def set_flag(self, flag):
         self.bit_flag = flag
+        self._flags = None
         return
         
     def set_fmt(self, fmt):
@@ -148,64 +1034,45 @@ class flagged_bytes(object):
         return self.bytes.hex()
         
     def to_bit(self):
-        return bytes2bit(self.bytes)
+        nbits = len(self.bytes) * 8
+        if nbits == 0:
+            return ''
+        return format(self._int(), '0{0}b'.format(nbits))[::-1]
         
     def to_list(self):
-        return bytes2list(self.bytes)
+        v = self._int()
+        return [(v >> i) & 1 for i in range(len(self.bytes) * 8)]
         
     def to_dictlist(self):
         bit = self.to_list()
-        flag_list = [f for flags in self.bit_flag for f in flags]
+        flag_list = self._positions()[0]
         dictlist = [{'index': i, 'flag': f, 'value': b} for i, (b, f)
                     in enumerate(zip(bit, flag_list))]
         return dictlist
         
     def to_int(self):
-        if len(self.bytes) == 1:
-            return self.unpack('<b')
-        
-        if len(self.bytes) == 2:
-            return self.unpack('<h')
-        
-        if len(self.bytes) == 4:
-            return self.unpack('<i')
-
-        if len(self.bytes) == 8:
-            return self.unpack('<q')
+        if len(self.bytes) in (1, 2, 4, 8):
+            return int.from_bytes(self.bytes, 'little', signed=True)
         
         return 0
     
     def to_uint(self):
-        if len(self.bytes) == 1:
-            return self.unpack('<B')
-        
-        if len(self.bytes) == 2:
-            return self.unpack('<H')
-        
-        if len(self.bytes) == 4:
-            return self.unpack('<I')
-
-        if len(self.bytes) == 8:
-            return self.unpack('<Q')
+        if len(self.bytes) in (1, 2, 4, 8):
+            return self._int()
         
         return 0
     
     def to_float(self):
-        if len(self.bytes) == 2:
-            return self.unpack('<e')
-        
-        if len(self.bytes) == 4:
-            return self.unpack('<f')
-
-        if len(self.bytes) == 8:
-            return self.unpack('<d')
-        
-        return 0.0
+        st = _float_structs.get(len(self.bytes))
+        if st is None:
+            return 0.0
+        return st.unpack(self.bytes)[0]
         
     def to_flags(self):
-        dictlist = self.to_dictlist()
-        flag = ' '.join([item['flag'] for item in dictlist 
-                         if item['value']==1])
+        v = self._int()
+        flag_list = self._positions()[0]
+        nbits = min(len(self.bytes) * 8, len(flag_list))
+        flag = ' '.join([flag_list[i] for i in range(nbits) if (v >> i) & 1])
         return flag
 
     def unpack(self, fmt=''):
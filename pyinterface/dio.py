@@ -0,0 +1,151 @@
+"""
+DIO ボード (PCI-2724, PCI-2702) の信号に名前を付けてまとめて扱います。
+
+信号は (ボード, 点) で指定します。点は 'OUT5', 'IN5' のような名前か、
+番号 (set では OUTn, get では INn) です。ボードは tools.open が返す
+オブジェクトかドライバです。
+
+    >>> import pyinterface.dio
+    >>> b1 = pyinterface.open(2724, 0)
+    >>> b2 = pyinterface.open(2702, 1)
+    >>> g = pyinterface.dio.signal_group({
+    ...     'valve_a': (b1, 'OUT3'),
+    ...     'shutter_b': (b2, 'OUT17'),
+    ...     'interlock': (b2, 'IN2'),
+    ... })
+    >>> g.set(valve_a=1, shutter_b=0)
+    >>> g.get()
+    {'interlock': 0}
+
+set() は信号をボードごとのマスクと値にまとめ、1 ボードあたり 1 回の
+書き込み (変化するバイトを含む byte/word/dword) にします。
+compile() でマスクと値を前もって作っておくこともできます。
+get() は 1 ボードあたり 1 回、グループの入力点を含む範囲だけを読みます。
+"""
+
+import re
+
+_point_name = re.compile(r'^(IN|OUT)[0-9]+$')
+
+
+def parse_point(driver, point):
+    # 'OUTn' -> ('out', n), 'INn' -> ('in', n), n -> (None, n); the names
+    # are looked up in the flag index of the driver
+    if isinstance(point, int):
+        return None, point
+    name = str(point).upper()
+    m = _point_name.match(name)
+    pos = driver.find_flag(name, m.group(1).lower()) if m else ()
+    if len(pos) != 1 or pos[0][0] != 0:
+        msg = "point must be 'INn', 'OUTn' or n, while {0!r} is given."
+        raise ValueError(msg.format(point))
+    bar_num, offset, mask = pos[0]
+    return m.group(1).lower(), 8 * offset + mask.bit_length()
+
+
+class signal_group(object):
+
+    def __init__(self, signals):
+        # signals: {name: (board, point)}
+        self.signals = dict(signals)
+        self.outputs = {}       # name -> (driver, bit mask of OUTn)
+        self.inputs = {}        # name -> (driver, n of INn)
+        self._read_plans = {}
+        for name, (board, point) in self.signals.items():
+            driver = getattr(board, 'driver', board)
+            direction, n = parse_point(driver, point)
+            if direction in (None, 'out'):
+                self._verify_point(name, n, driver.num_output)
+                self.outputs[name] = (driver, 1 << (n - 1))
+                pass
+            if direction in (None, 'in'):
+                self._verify_point(name, n, driver.num_input)
+                self.inputs[name] = (driver, n)
+                pass
+            continue
+        pass
+
+    @staticmethod
+    def _verify_point(name, n, io_number):
+        if (n < 1) or (n > io_number):
+            msg = 'I/O number of {0!r} must be in 1-{1},'.format(name, io_number)
+            msg += ' while {0} is given.'.format(n)
+            raise ValueError(msg)
+        return
+
+    @property
+    def names(self):
+        return list(self.signals)
+
+    def compile(self, values=None, **kwargs):
+        # {name: 0/1} -> ((driver, mask, value), ...), one entry per board
+        if values is not None:
+            kwargs = dict(values, **kwargs)
+            pass
+        writes = {}
+        for name, v in kwargs.items():
+            try:
+                driver, bit = self.outputs[name]
+            except KeyError:
+                raise KeyError('{0!r} is not an output of the group'.format(name))
+            w = writes.get(driver)
+            if w is None:
+                w = writes[driver] = [driver, 0, 0]
+                pass
+            w[1] |= bit
+            if v:
+                w[2] |= bit
+            else:
+                w[2] &= ~bit
+                pass
+            continue
+        return tuple(tuple(w) for w in writes.values())
+
+    def apply(self, plan):
+        # writes a compile()d plan
+        for driver, mask, value in plan:
+            driver.output_point_mask(mask, value)
+            continue
+        return
+
+    def set(self, values=None, **kwargs):
+        self.apply(self.compile(values, **kwargs))
+        return
+
+    def _read_plan(self, names):
+        # ((driver, start, num, ((name, shift), ...)), ...), one per board
+        plan = self._read_plans.get(names)
+        if plan is not None:
+            return plan
+        boards = {}
+        for name in names or self.inputs:
+            try:
+                driver, n = self.inputs[name]
+            except KeyError:
+                raise KeyError('{0!r} is not an input of the group'.format(name))
+            boards.setdefault(driver, []).append((name, n))
+            continue
+        plan = []
+        for driver, points in boards.items():
+            start = min(n for name, n in points)
+            num = max(n for name, n in points) - start + 1
+            plan.append((driver, start, num,
+                         tuple((name, n - start) for name, n in points)))
+            continue
+        plan = self._read_plans[names] = tuple(plan)
+        return plan
+
+    def get(self, *names):
+        # {name: 0/1} of the inputs names (all inputs if not given)
+        values = {}
+        for driver, start, num, points in self._read_plan(names):
+            d = driver.input_point_int(start, num)
+            for name, shift in points:
+                values[name] = (d >> shift) & 1
+                continue
+            continue
+        return values
+
+    def __repr__(self):
+        return '<signal_group: {0} outputs, {1} inputs>'.format(
+            len(self.outputs), len(self.inputs))
@@ -0,0 +1,127 @@
+"""
+ボードの検出結果 (PCI スロット -> (デバイス ID, RSW)) のキャッシュです。
+
+tools.open は、キャッシュにあるスロットのボードだけを開き、未知の
+スロットを調べたときはその結果を記録します。スロットは BAR の
+アドレスで識別します (pypci の lspci はスロット番号を返さないため)。
+
+path を指定するとファイル (JSON) に保存され、次のプロセスでも使われます。
+読み込んだ内容は PCI バスの一覧 (lspci) と照合され、存在しないスロットや
+デバイス ID の異なるスロットの記録は捨てられます。キャッシュの RSW で
+開いたボードの board_id が一致しない場合も、その記録を捨てて調べ直します。
+
+    >>> cache = pyinterface.discovery.discovery_cache('/var/tmp/pyinterface.json')
+    >>> b = pyinterface.open(2724, 0, cache=cache)
+"""
+
+import os
+import json
+import weakref
+
+
+class discovery_cache(object):
+    format = 1
+
+    def __init__(self, path=None):
+        self.path = path
+        self.slots = {}
+        self._validated = set()
+        self._dirty = False
+        if (path is not None) and os.path.exists(path):
+            self.load()
+            pass
+        pass
+
+    @staticmethod
+    def slot_key(conf):
+        return ','.join('{0}:{1:x}'.format(bar.type, bar.addr)
+                        for bar in conf.bar)
+
+    def lookup(self, conf):
+        # RSW (board_id) recorded for the slot of conf, or None
+        entry = self.slots.get(self.slot_key(conf))
+        if (entry is None) or (entry[0] != conf.device_id):
+            return None
+        return entry[1]
+
+    def store(self, conf, board_id):
+        entry = [conf.device_id, board_id]
+        key = self.slot_key(conf)
+        if self.slots.get(key) != entry:
+            self.slots[key] = entry
+            self._dirty = True
+            pass
+        return
+
+    def forget(self, conf):
+        if self.slots.pop(self.slot_key(conf), None) is not None:
+            self._dirty = True
+            pass
+        return
+
+    def validate(self, device_id, confs):
+        # drops the records of device_id whose slot is not in confs
+        # (the lspci result for device_id); done once per device
+        if device_id in self._validated:
+            return
+        present = {self.slot_key(_) for _ in confs}
+        for key, entry in list(self.slots.items()):
+            if (entry[0] == device_id) and (key not in present):
+                del self.slots[key]
+                self._dirty = True
+                pass
+            continue
+        for conf in confs:
+            entry = self.slots.get(self.slot_key(conf))
+            if (entry is not None) and (entry[0] != device_id):
+                self.forget(conf)
+                pass
+            continue
+        self._validated.add(device_id)
+        return
+
+    def clear(self):
+        self.slots = {}
+        self._validated = set()
+        self._dirty = True
+        return
+
+    def load(self):
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+                pass
+        except (OSError, ValueError):
+            return
+        if data.get('format') != self.format:
+            return
+        self.slots = {key: list(entry)
+                      for key, entry in data.get('slots', {}).items()}
+        self._validated = set()
+        self._dirty = False
+        return
+
+    def save(self):
+        if (self.path is None) or (not self._dirty):
+            return
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'format': self.format, 'slots': self.slots}, f,
+                      indent=1, sort_keys=True)
+            pass
+        os.replace(tmp, self.path)
+        self._dirty = False
+        return
+
+
+# in-memory cache of each backend object (pypci module, sim_backend, ...)
+_caches = weakref.WeakKeyDictionary()
+
+
+def get_cache(backend):
+    cache = _caches.get(backend)
+    if cache is None:
+        cache = discovery_cache()
+        _caches[backend] = cache
+        pass
+    return cache
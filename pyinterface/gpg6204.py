@@ -609,14 +609,7 @@ class gpg6204(object):
         """
         self._verify_ch(ch)
 
-        c = self.driver.get_counter(ch)
-        
-        if unsigned:
-            return c.to_uint()
-        else:
-            return c.to_int()
-            
-        return 
+        return self.driver.read_counter(ch, unsigned)
     
 
     def set_comparator(self, count, unsigned=True, ch=1):
@@ -700,13 +693,7 @@ class gpg6204(object):
         self._verify_ch(ch)
 
         c = self.driver.get_comparator(ch)
-        
-        if unsigned:
-            return c.to_uint()
-        else:
-            return c.to_int()
-            
-        return 
+        return self.driver.counter_fields[unsigned].decode(c)
     
 
     def get_status(self, ch=1):
@@ -79,7 +79,7 @@ class gpg7204(object):
         axis がボードの軸数を越す場合 ValueError となります。
         ボードの軸数は、num_axis に格納されています。        
         """
-        return self.driver.set_base_clock(axis)
+        return self.driver.set_base_clock(clock, axis)
 
     
     def set_pulse_out(self, mode, config, axis=1):
@@ -211,6 +211,33 @@ class gpg7400(object):
         return
 
 
+    def wait_motion_stop(self, axis, timeout=60):
+        """指定した軸の動作が停止するまで待ちます。
+
+        Parameters
+        ----------
+        axis : str
+            軸を指定します。 'x', 'xy', 'xyzu' など。
+        timeout : float
+            待ち時間の上限 [s] です。
+
+        Returns
+        -------
+        なし
+
+        Examples
+        --------
+        >>> m.start_motion('xy', 'const', 'ptp')
+        >>> m.wait_motion_stop('xy')
+
+        Exceptions
+        ----------
+        timeout までに停止しない場合、core.WaitTimeoutError となります。
+        """
+        self.driver.wait_motion_stop(axis, timeout)
+        return
+
+
     def change_speed(self, axis, mode, speed):
         """動作中に速度パターン変更を行います。
         (GPG-7400 33. MtnChangeSpeed)
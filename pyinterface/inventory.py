@@ -0,0 +1,140 @@
+"""
+PCI バス上の Interface ボードの一覧を作ります。
+
+ドライバは作らず、ボード ID (RSW) のレジスタ 1 バイトだけを読みます。
+ボードごとの読み出しはスレッドで並列に行います。読み出しに失敗した
+ボードは rsw が None で、error に例外の型とメッセージが入ります。
+
+    >>> import pyinterface.inventory
+    >>> pyinterface.inventory.inventory()
+    [{'device_id': 2724, 'rsw': '0', 'error': None, 'slot': '0000:03:00.0',
+      'key': 'mem:f7d00000', 'bars': [{'type': 'mem', 'addr': ..., 'size': ...}]},
+     ...]
+
+    $ pyinterface-lspci [--backend mmio] [--device 2724]
+"""
+
+import os
+import sys
+import json
+import argparse
+import concurrent.futures
+
+from . import tools
+from . import backend as _backend
+from . import discovery as _discovery
+
+
+interface_vendor_id = 0x1147
+
+sysfs_pci_devices = '/sys/bus/pci/devices'
+
+
+def probe_board_id(conf, backend):
+    # same value as driver.board_id: low nibble of the RSW register
+    reg = tools.board_id_registers.get(conf.device_id)
+    if reg is None:
+        # boards added by entry points: open them
+        b = tools.get_open_func(conf.device_id)(conf, backend)
+        return b.board_id
+    bar_num, offset = reg
+    d = backend.read(conf.bar[bar_num], offset, 1)
+    return format(d[0], '02x')[1]
+
+
+def _probe(conf, backend):
+    # (board_id, None), or (None, 'error type: message') if the probe fails
+    try:
+        return probe_board_id(conf, backend), None
+    except Exception as e:
+        return None, '{0}: {1}'.format(type(e).__name__, e)
+
+
+def sysfs_slots(root=sysfs_pci_devices):
+    # BAR address -> PCI slot name (e.g. '0000:03:00.0')
+    slots = {}
+    try:
+        devices = os.listdir(root)
+    except OSError:
+        return slots
+    for dev in devices:
+        try:
+            with open(os.path.join(root, dev, 'resource')) as f:
+                lines = f.read().split('\n')
+                pass
+        except OSError:
+            continue
+        for line in lines:
+            if line.strip() == '': continue
+            addr = int(line.split()[0], 16)
+            if addr:
+                slots[addr] = dev
+                pass
+            continue
+        continue
+    return slots
+
+
+def inventory(backend=None, device=None, max_workers=8, cache=None):
+    # records sorted by (device_id, rsw); the RSW of every probed slot
+    # is also stored in the discovery cache used by tools.open. A card
+    # whose probe fails is listed with rsw None and the error message
+    backend = _backend.get_backend(backend)
+    confs = backend.lspci(interface_vendor_id, device)
+    if cache is None:
+        cache = _discovery.get_cache(backend)
+        pass
+
+    slot_name = getattr(backend, 'slot_name', None)
+    if slot_name is None:
+        slots = sysfs_slots()
+        slot_name = lambda conf: next(
+            (slots[b.addr] for b in conf.bar if b.addr in slots), None)
+        pass
+
+    if len(confs) > 1 and max_workers > 1:
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            results = list(executor.map(lambda c: _probe(c, backend), confs))
+            pass
+    else:
+        results = [_probe(c, backend) for c in confs]
+        pass
+
+    records = []
+    for conf, (rsw, error) in zip(confs, results):
+        if error is None:
+            cache.store(conf, rsw)
+            pass
+        records.append({
+            'device_id': conf.device_id,
+            'rsw': rsw,
+            'error': error,
+            'slot': slot_name(conf),
+            'key': cache.slot_key(conf),
+            'bars': [{'type': b.type, 'addr': b.addr, 'size': b.size}
+                     for b in conf.bar],
+        })
+        continue
+    cache.save()
+    return sorted(records, key=lambda x: (x['device_id'], x['rsw'] or ''))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        prog='pyinterface-lspci',
+        description='list Interface PCI boards as JSON')
+    p.add_argument('--backend', default=None,
+                   help="'pypci' (default) or 'mmio'")
+    p.add_argument('--device', type=int, default=None,
+                   help='device id (e.g. 2724)')
+    p.add_argument('--indent', type=int, default=None)
+    args = p.parse_args(argv)
+
+    records = inventory(args.backend, args.device)
+    json.dump(records, sys.stdout, indent=args.indent)
+    sys.stdout.write('\n')
+    return
+
+
+if __name__ == '__main__':
+    main()
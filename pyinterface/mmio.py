@@ -0,0 +1,155 @@
+"""
+メモリ空間 BAR を mmap してアクセスする I/O バックエンドです。
+
+pypci.read/pypci.write は呼び出しのたびに /dev/mem を mmap し直しますが、
+このバックエンドは sysfs の resourceN ファイルを BAR ごとに一度だけ mmap し、
+memoryview と struct 経由で読み書きします。I/O 空間の BAR は pypci
+(ポート I/O) にフォールバックします。
+
+    >>> b = pyinterface.open(2724, 0, backend='mmio')
+
+resource_paths に BAR とファイルパスの対応を渡すと、sysfs の代わりに任意の
+ファイル（試験用の一時ファイルなど）を BAR として使います。
+"""
+
+import os
+import mmap
+import struct
+
+
+sysfs_pci_devices = '/sys/bus/pci/devices'
+
+_uint_structs = {
+    1: struct.Struct('<B'),
+    2: struct.Struct('<H'),
+    4: struct.Struct('<I'),
+    8: struct.Struct('<Q'),
+}
+
+
+class BadAccessError(Exception):
+    pass
+
+
+def _pypci():
+    import pypci
+    return pypci
+
+
+def find_resource(bar, root=sysfs_pci_devices):
+    if not bar.addr:
+        return None
+
+    for dev in sorted(os.listdir(root)):
+        try:
+            with open(os.path.join(root, dev, 'resource')) as f:
+                lines = f.read().split('\n')
+                pass
+        except OSError:
+            continue
+
+        for i, line in enumerate(lines):
+            if line.strip() == '': continue
+            if int(line.split()[0], 16) == bar.addr:
+                return os.path.join(root, dev, 'resource{0}'.format(i))
+            continue
+        continue
+    return None
+
+
+class mmio_backend(object):
+
+    def __init__(self, resource_paths=None):
+        self.resource_paths = dict(resource_paths or {})
+        self._maps = {}
+        pass
+
+    def lspci(self, vendor=None, device=None):
+        return _pypci().lspci(vendor, device)
+
+    def _view(self, bar):
+        view = self._maps.get(bar)
+        if view is not None:
+            return view
+
+        path = self.resource_paths.get(bar)
+        if path is None:
+            path = find_resource(bar)
+            pass
+        if path is None:
+            msg = 'resource file for BAR 0x{0:x} is not found'.format(bar.addr)
+            raise BadAccessError(msg)
+
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+        try:
+            m = mmap.mmap(fd, bar.size, mmap.MAP_SHARED,
+                          mmap.PROT_READ | mmap.PROT_WRITE)
+        finally:
+            os.close(fd)
+            pass
+        view = memoryview(m)
+        # another thread may have mapped the BAR meanwhile; keep one map
+        mapped = self._maps.setdefault(bar, view)
+        if mapped is not view:
+            view.release()
+            m.close()
+            pass
+        return mapped
+
+    def _verify_access_range(self, bar, offset, size):
+        if (offset < 0) or (size < 0) or (offset + size > bar.size):
+            msg = 'PCI addr space is 0-{0}'.format(hex(bar.size-1))
+            msg += ' while tried to access {0}-{1}.'.format(hex(offset),
+                                                            hex(offset+size-1))
+            raise BadAccessError(msg)
+        return
+
+    def read(self, bar, offset, size):
+        if bar.type != 'mem':
+            return _pypci().read(bar, offset, size)
+        self._verify_access_range(bar, offset, size)
+        return self._view(bar)[offset:offset+size].tobytes()
+
+    def write(self, bar, offset, data):
+        if bar.type != 'mem':
+            return _pypci().write(bar, offset, data)
+        size = len(data)
+        self._verify_access_range(bar, offset, size)
+        self._view(bar)[offset:offset+size] = data
+        return
+
+    def read_into(self, bar, offset, buf, pos=0, size=None):
+        dst = memoryview(buf).cast('B')
+        if size is None:
+            size = len(dst) - pos
+            pass
+        if bar.type != 'mem':
+            dst[pos:pos+size] = _pypci().read(bar, offset, size)
+            return size
+        self._verify_access_range(bar, offset, size)
+        dst[pos:pos+size] = self._view(bar)[offset:offset+size]
+        return size
+
+    def read_uint(self, bar, offset, size):
+        if bar.type != 'mem':
+            return int.from_bytes(_pypci().read(bar, offset, size), 'little')
+        self._verify_access_range(bar, offset, size)
+        return _uint_structs[size].unpack_from(self._view(bar), offset)[0]
+
+    def unpack_from(self, fmt, bar, offset=0):
+        if not isinstance(fmt, struct.Struct):
+            fmt = struct.Struct(fmt)
+            pass
+        if bar.type != 'mem':
+            return fmt.unpack(_pypci().read(bar, offset, fmt.size))
+        self._verify_access_range(bar, offset, fmt.size)
+        return fmt.unpack_from(self._view(bar), offset)
+
+    def close(self):
+        for view in self._maps.values():
+            m = view.obj
+            view.release()
+            m.close()
+            continue
+        self._maps = {}
+        return
@@ -49,9 +49,11 @@ class pci2724_driver(core.interface_driver):
             ('', '', '', '', '', '', '', ''),
         ),
     )
+
+    always_write_registers = frozenset([(0, 0x08), (0, 0x09)])
     
-    num_input = 64
-    num_output = 64
+    num_input = 32
+    num_output = 32
     
     available_input_byte_ranges = [
         'IN1_8',
@@ -112,24 +114,59 @@ class pci2724_driver(core.interface_driver):
     
     
     def input_point(self, start, num):
-        self._verify_io_number_access(start, num, self.num_input)
-        inp = self.input_dword('IN1_32')
-        bits = inp.to_list()[start-1:start+num-1]
-        return bits
+        value = self.input_point_int(start, num)
+        return [(value >> i) & 1 for i in range(num)]
     
     
     def output_point(self, data, start):
+        # data: list of 0/1 (or a numpy array)
+        self.output_point_int(core.list2int(data), start, len(data))
+        return 
+    
+    
+    def input_point_int(self, start=1, num=None):
+        # points start, ..., start+num-1 as an int (bit 0 = point start);
+        # reads only the aligned span of bytes holding them
         bar = 0
-        offset = 0x00
         
-        num = len(data)
+        if num is None: num = self.num_input - start + 1
+        self._verify_io_number_access(start, num, self.num_input)
+        lo, hi = core.aligned_span((start-1) >> 3, (start+num-2) >> 3)
+        d = self.read(bar, lo, hi-lo)
+        value = int.from_bytes(d.bytes, 'little') >> (start - 1 - 8*lo)
+        return value & ((1 << num) - 1)
+    
+    
+    def output_point_int(self, value, start=1, num=None):
+        # sets points start, ..., start+num-1 to the bits of value (bit 0 =
+        # point start); writes only the aligned span of the changed bytes
+        if num is None: num = self.num_output - start + 1
         self._verify_io_number_access(start, num, self.num_output)
-        new_d = self.log_bytes_out[0][0:4]
-        new_d = core.bytes2list(new_d)
-        new_d[start-1:start+num-1] = data
-        new_d = core.list2bytes(new_d)
-        self.write(bar, offset, new_d)
-        return 
+        self.output_point_mask(core.point_mask(start, num), value << (start - 1))
+        return
+    
+    
+    def output_point_mask(self, mask, value):
+        # sets the points of mask (bit 0 = OUT1) to the bits of value, in one
+        # write of the aligned span of the changed bytes
+        bar = 0
+        offset = 0x00
+        
+        if mask >> self.num_output:
+            msg = 'I/O number must be in 1-{0},'.format(self.num_output)
+            msg += ' while {0} is given.'.format(mask.bit_length())
+            raise ValueError(msg)
+        self.update_bits_span(bar, offset, self.num_output // 8, mask, value)
+        return
+    
+    
+    def input_point_array(self, start=1, num=None):
+        # input_point_int() as a numpy bool array
+        numpy = core._numpy()
+        if num is None: num = self.num_input - start + 1
+        value = self.input_point_int(start, num)
+        d = numpy.frombuffer(value.to_bytes((num + 7) // 8, 'little'), numpy.uint8)
+        return numpy.unpackbits(d, count=num, bitorder='little').astype(bool)
     
     
     def input_byte(self, range_):
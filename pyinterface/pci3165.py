@@ -105,6 +105,8 @@ class pci3165_driver(core.interface_driver):
         )
     )
 
+    always_write_registers = frozenset([(0, 0x04), (1, 0x01), (1, 0x02), (1, 0x03)])
+
 
 
 
@@ -214,15 +216,13 @@ class pci3165_driver(core.interface_driver):
 
 
 
-    def _busy(self):
+    def _busy(self, timeout=1.0):
         bar = 0
         size = 1
         offset = 0x03
 
 
-        busy = self.read(bar, offset, size)
-        while busy.to_list()[7]==0:
-            busy = self.read(bar, offset, size)
+        self.wait_until(bar, offset, 0x80, 0x80, timeout, size)
         return
 
 
@@ -122,6 +122,8 @@ class pci3177_driver(core.interface_driver):
         )
     )
 
+    always_write_registers = frozenset([(0, 0x04), (1, 0x01), (1, 0x02), (1, 0x03)])
+
     available_ranges = [
         '0_5V',
         '0_10V',
@@ -135,13 +137,19 @@ class pci3177_driver(core.interface_driver):
     
     _last_ch_no = -1
     _last_single_diff = ''
-    conf = {}
-    buffer = multiprocessing.Array('f', [])
-    dtlog = multiprocessing.Array('f', [])
     smpl_status = 'STOP_SAMPLING'
-    smpl_count = multiprocessing.Value('l', 0)
-    flag_stop_sampling = multiprocessing.Value('b', True)
+    state_attributes = ('_last_ch_no', '_last_single_diff', 'conf')
+    readback_registers = ((0, 0x05, 1),)
     
+    def __init__(self, pci_config, backend=None):
+        self.conf = {}
+        self.buffer = multiprocessing.Array('f', [])
+        self.dtlog = multiprocessing.Array('f', [])
+        self.smpl_count = multiprocessing.Value('l', 0)
+        self.flag_stop_sampling = multiprocessing.Value('b', True)
+        super().__init__(pci_config, backend)
+        pass
+
     def get_board_id(self):
         bar = 0
         offset = 0x17
@@ -290,9 +298,11 @@ class pci3177_driver(core.interface_driver):
         return d
     
     def input_ad(self, single_diff, smpl_ch_req):
-        self._set_single_diff(single_diff)
-        d = [self._get_ad_oneshot(r['ch_no'], r['range'])
-             for r in smpl_ch_req]
+        with self.lock(0):
+            self._set_single_diff(single_diff)
+            d = [self._get_ad_oneshot(r['ch_no'], r['range'])
+                 for r in smpl_ch_req]
+            pass
         return d
     
     def input_di(self):
@@ -315,10 +325,12 @@ class pci3177_driver(core.interface_driver):
         
     
 
-    def _wait_operation_stop(self):
-        while self._is_busy():
-            time.sleep(1e-6)
-            continue
+    def _wait_operation_stop(self, timeout=1.0):
+        bar = 0
+        size = 1
+        offset = 0x03
+        
+        self.wait_until(bar, offset, 0x80, 0x80, timeout, size)
         return
 
     def _get_ad_oneshot(self, ch, range_):
@@ -342,15 +354,6 @@ class pci3177_driver(core.interface_driver):
         self._last_single_diff = single_diff
         return
 
-    def _is_busy(self):
-        bar = 0
-        size = 1
-        offset = 0x03
-        
-        is_idle = self.read(bar, offset, size)[7]
-        is_busy = not is_idle
-        return is_busy
-    
     def _set_ch_and_start_adc(self, ch):
         bar = 0
         size = 1
@@ -101,6 +101,8 @@ class pci3342_driver(core.interface_driver):
         ),
     )        
 
+    always_write_registers = frozenset([(0, 0x00), (0, 0x01), (0, 0x05), (0, 0x06)])
+
 
     def get_board_id(self):
         bar = 0
@@ -141,6 +141,8 @@ class pci3346_driver(core.interface_driver):
             ('', '', '', '', '', '', '', '') #1F
         ),
     )
+
+    always_write_registers = frozenset([(0, 0x00), (0, 0x01), (0, 0x05), (0, 0x06)])
     
     available_ranges = [
         '0_10V',
@@ -152,6 +154,14 @@ class pci3346_driver(core.interface_driver):
     available_do_channel_num = 2
 
     last = {}
+    state_attributes = ('last',)
+    # output channel, range channel and output on/off
+    readback_registers = ((0, 0x02, 1), (0, 0x07, 1), (0, 0x1b, 1))
+
+    def __init__(self, pci_config, backend=None):
+        self.last = {}
+        super().__init__(pci_config, backend)
+        pass
 
     def get_board_id(self):
         bar = 0
@@ -207,12 +217,14 @@ class pci3346_driver(core.interface_driver):
         raise NotImplemented()
     
     def output_da(self, smpl_ch_req, data):
-        self._set_output_on()
-        self._set_control_mode_wait()
-        for req, d in zip(smpl_ch_req, data):
-            self._set_output_voltage(req['ch_no'], req['range'], d)
-            continue
-        self._set_control_mode_sync()
+        with self.transaction():
+            self._set_output_on()
+            self._set_control_mode_wait()
+            for req, d in zip(smpl_ch_req, data):
+                self._set_output_voltage(req['ch_no'], req['range'], d)
+                continue
+            self._set_control_mode_sync()
+            pass
         return
     
     def input_di(self):
@@ -118,9 +118,26 @@ class pci6204_driver(core.interface_driver):
         )
     )
 
+    always_write_registers = frozenset([
+        (0, 0x00), (0, 0x01), (0, 0x02), (0, 0x03), (0, 0x06),
+        (0, 0x10), (0, 0x11), (0, 0x12), (0, 0x13), (0, 0x16),
+    ])
+
     available_ch = [1, 2]
+    counter_fields = {
+        True: core.register_field(0x00, 4, signed=False, name='counter'),
+        False: core.register_field(0x00, 4, signed=True, name='counter'),
+    }
     latch_status = {1: 0, 2: 0}
-    comparator = {1: 0, 2: 0}
+    comparator = {1: bytes(4), 2: bytes(4)}
+    state_attributes = ('latch_status', 'comparator')
+    readback_registers = ((0, 0x04, 1), (0, 0x14, 1))
+    
+    def __init__(self, pci_config, backend=None):
+        self.latch_status = dict(self.latch_status)
+        self.comparator = dict(self.comparator)
+        super().__init__(pci_config, backend)
+        pass
     
     def get_board_id(self):
         bar = 1
@@ -166,14 +183,16 @@ class pci6204_driver(core.interface_driver):
 
     
     def set_mode(self, mode='', direction=0, equal=0, latch=0, ch=1):
-        last = self.get_mode(ch)
-        if mode is None: mode = last['mode']
-        if direction is None: direction = last['direction']
-        if equal is None: equal = last['equal']
-        if latch is None: latch = last['latch']
+        with self.lock(0):
+            last = self.get_mode(ch)
+            if mode is None: mode = last['mode']
+            if direction is None: direction = last['direction']
+            if equal is None: equal = last['equal']
+            if latch is None: latch = last['latch']
 
-        self._set_mode(mode, direction, equal, ch)
-        self._set_latch(latch, ch)
+            self._set_mode(mode, direction, equal, ch)
+            self._set_latch(latch, ch)
+            pass
         return
 
     
@@ -218,14 +237,16 @@ class pci6204_driver(core.interface_driver):
 
     def set_z_mode(self, clear_condition=None, latch_condition=None,
                    z_polarity=None, l_polarity=None, ch=1):
-        last = self.get_z_mode(ch)
-        if clear_condition is None: clear_condition = last['clear_condition']
-        if latch_condition is None: latch_condition = last['latch_condition']
-        if z_polarity is None: z_polarity = last['z_polarity']
-        if l_polarity is None: l_polarity = last['l_polarity']
+        with self.lock(0):
+            last = self.get_z_mode(ch)
+            if clear_condition is None: clear_condition = last['clear_condition']
+            if latch_condition is None: latch_condition = last['latch_condition']
+            if z_polarity is None: z_polarity = last['z_polarity']
+            if l_polarity is None: l_polarity = last['l_polarity']
 
-        self._set_z_mode(clear_condition, latch_condition,
-                         z_polarity, l_polarity, ch)
+            self._set_z_mode(clear_condition, latch_condition,
+                             z_polarity, l_polarity, ch)
+            pass
         return
         
     
@@ -290,9 +311,7 @@ class pci6204_driver(core.interface_driver):
         bar = 0
         offset = self._get_offset_for(ch, 0x05)
         
-        flags = self.get_log('out', bar, offset).to_flags()
-        flags = flags.replace('P/L', '')
-        self.set_flag(bar, offset, flags)
+        self.update_flags(bar, offset, clear_flags='P/L')
         return
     
 
@@ -300,9 +319,7 @@ class pci6204_driver(core.interface_driver):
         bar = 0
         offset = self._get_offset_for(ch, 0x05)
         
-        flags = self.get_log('out', bar, offset).to_flags()
-        flags += ' P/L'
-        self.set_flag(bar, offset, flags)
+        self.update_flags(bar, offset, set_flags='P/L')
         return
     
 
@@ -346,6 +363,15 @@ class pci6204_driver(core.interface_driver):
         return self.read(bar, offset, size)
 
     
+    def read_counter(self, ch=1, unsigned=True):
+        bar = 0
+        offset = self._get_offset_for(ch, 0x00)
+        
+        self.set_counter_mode()
+        self.latch(ch)
+        return self.read_field(bar, self.counter_fields[unsigned], offset)
+
+    
     def get_comparator(self, ch=1):
         return self.comparator[ch]
     
@@ -1,6 +1,6 @@
 
+import copy
 import struct
-import time
 from . import core
 
 
@@ -106,13 +106,25 @@ class pci7204_driver(core.interface_driver):
             ('RST', '', '', '', '', '', '', ''),
         )
     )
+
+    always_write_registers = frozenset([(1, 0x00), (1, 0x01), (2, 0x00), (2, 0x01)])
     
 
     soft_inter_lock = [True, True]
     base_clock = ['CLOCK_1_16M', 'CLOCK_1_16M']
     motion_config = [{'JOG': {}, 'PTP': {}},
                      {'JOG': {}, 'PTP': {}}]
+    state_attributes = ('soft_inter_lock', 'base_clock', 'motion_config')
+    # limit logic/mask and pulse output mode of each axis
+    readback_registers = ((1, 0x08, 3), (2, 0x08, 3))
+    
     
+    def __init__(self, pci_config, backend=None):
+        self.soft_inter_lock = list(self.soft_inter_lock)
+        self.base_clock = list(self.base_clock)
+        self.motion_config = copy.deepcopy(self.motion_config)
+        super().__init__(pci_config, backend)
+        pass
     
     def get_board_id(self):
         bar = 0
@@ -151,14 +163,7 @@ class pci7204_driver(core.interface_driver):
         offset = 0x00
         size = 1
         
-        t0 = time.time()
-        while (time.time() - t0) < timeout:
-            if self.ppmc_is_readable(axis):
-                break
-            time.sleep(0.0005)
-            continue
-        else:
-            raise Exception('PPMC data register is busy')
+        self.wait_until(bar, 0x01, 0b00000001, 0b00000001, timeout)
 
         d = self.read(bar, offset, size)
         return d
@@ -182,14 +187,7 @@ class pci7204_driver(core.interface_driver):
             data = data.to_bytes(1, 'little')
             pass
         
-        t0 = time.time()
-        while (time.time() - t0) < timeout:
-            if self.ppmc_is_writable(axis):
-                break
-            time.sleep(0.0005)
-            continue
-        else:
-            raise Exception('PPMC data register is busy')
+        self.wait_until(bar, 0x01, 0b00000010, 0b00000000, timeout)
         
         self.write(bar, offset, data)
         return
@@ -203,15 +201,7 @@ class pci7204_driver(core.interface_driver):
             data = data.to_bytes(1, 'little')
             pass
         
-        t0 = time.time()
-        while (time.time() - t0) < timeout:
-            status = self.ppmc_read_status(axis)
-            if (not status['IBF']) & (not status['IST']):
-                break
-            time.sleep(0.0005)
-            continue
-        else:
-            raise Exception('PPMC command register is busy')
+        self.wait_until(bar, 0x01, 0b01000010, 0b00000000, timeout)
         
         self.write(bar, offset, data)
         return
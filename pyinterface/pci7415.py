@@ -1,4 +1,5 @@
 
+import copy
 import struct
 import time
 from . import core
@@ -25,32 +26,28 @@ def to_prip_format(x):
     data = [struct.pack('<I', i & 0xfffffff) for i in x]
     return data
 
+comp28_field = core.register_field(0, 4, signed=True, bits=(0, 28))
+comp16_field = core.register_field(0, 4, signed=True, bits=(0, 16))
+int32_field = core.register_field(0, 4, signed=True)
+
 def from_comp28_format(x):
-    data = []
-    for i in x:
-        a = i.to_bit()[0:28][::-1]
-        b = -int(a[0]) << len(a) | int(a, 2)
-        data.append(b)
+    decode = comp28_field.decode
+    data = [decode(i.bytes) for i in x]
     return data
 
 def from_comp16_format(x):
-    data = []
-    for i in x:
-        a = i.to_bit()[0:16][::-1]
-        b = -int(a[0]) << len(a) | int(a, 2)
-        data.append(b)
+    decode = comp16_field.decode
+    data = [decode(i.bytes) for i in x]
     return data
 
 def from_byte_format(x):
-    data = [i.to_int() for i in x]
+    decode = int32_field.decode
+    data = [decode(i.bytes) for i in x]
     return data
 
 def from_rpls_format(x):
-    data = []
-    for i in x:
-        a = i.to_bit()[0:28][::-1]
-        b = -int(a[0]) << len(a) | int(a, 2)
-        data.append(b)
+    decode = comp28_field.decode
+    data = [decode(i.bytes) for i in x]
     return data
 
 def do_nothing(x):
@@ -168,6 +165,8 @@ class pci7415_driver(core.interface_driver):
         )
     )
 
+    always_write_registers = frozenset([(1, _o) for _o in range(0x20)])
+
     cmd_dict = {
         'write': {
             'rmv': {'cmd': 0x90, 'func': to_comp28_format},
@@ -342,6 +341,15 @@ class pci7415_driver(core.interface_driver):
     }
 
     _last_param = {}
+    state_attributes = ('_last_param', 'motion_conf')
+    # _last_param entries read back from the chip by verify_state()
+    verify_params = ('rmv', 'rfl', 'rfh', 'rur', 'rdr', 'rmg')
+
+    def __init__(self, pci_config, backend=None):
+        self.motion_conf = copy.deepcopy(self.motion_conf)
+        self._last_param = {}
+        super().__init__(pci_config, backend)
+        pass
 
     def get_board_id(self):
         bar = 0
@@ -417,24 +425,44 @@ class pci7415_driver(core.interface_driver):
         return ret
 
     def set_param(self, data, name, axis):
-        data_axis_list = self._check_last_param(data, name, axis)
-        data = data_axis_list[0]
-        axis = data_axis_list[1]
-        if data != []:
-            comb0 = self.cmd_dict['write'][name]['cmd']
-            data = self.cmd_dict['write'][name]['func'](data)
-            self._pcl_write_data(data, axis)
-            self._pcl_write_command(comb0, axis)
-        else: pass
+        with self.lock(1):
+            data_axis_list = self._check_last_param(data, name, axis)
+            data = data_axis_list[0]
+            axis = data_axis_list[1]
+            if data != []:
+                comb0 = self.cmd_dict['write'][name]['cmd']
+                data = self.cmd_dict['write'][name]['func'](data)
+                self._pcl_write_data(data, axis)
+                self._pcl_write_command(comb0, axis)
+            else: pass
         return
 
     def get_param(self, name, axis):
-        comb0 = self.cmd_dict['read'][name]['cmd']
-        self._pcl_write_command(comb0, axis)
-        data_flag = self._pcl_read_data(axis)
+        with self.lock(1):
+            comb0 = self.cmd_dict['read'][name]['cmd']
+            self._pcl_write_command(comb0, axis)
+            data_flag = self._pcl_read_data(axis)
+            pass
         data = self.cmd_dict['read'][name]['func'](data_flag)
         return data
 
+    def verify_state(self, state):
+        # every saved speed/step parameter must read back from the chip,
+        # from the register or from its pre-register
+        checked = False
+        last_param = state['attributes']['_last_param']
+        for name in self.verify_params:
+            for axis, value in last_param.get(name, {}).items():
+                if value is None:
+                    continue
+                live = [self.get_param(n, axis)[0] for n in (name, 'p' + name)]
+                if value not in live:
+                    return False
+                checked = True
+                continue
+            continue
+        return checked
+
     def send_cmd(self, name, axis):
         comb0 = self.cmd_dict['send'][name]['cmd']
         self._pcl_write_command(comb0, axis)
@@ -448,7 +476,6 @@ class pci7415_driver(core.interface_driver):
         status_list = []
         for i in offset_list:
             status_list.append(self.read(bar, i, size).to_bit())
-            time.sleep(0.01)
         return status_list
 
     def check_move_onoff(self, axis):
@@ -456,6 +483,17 @@ class pci7415_driver(core.interface_driver):
         move_onoff_list = [int(i[0]) for i in status_list]
         return move_onoff_list
 
+    def wait_motion_stop(self, axis, timeout=60):
+        bar = 1
+        offset = 0x00
+        size = 2
+        offset_list = self._make_offset_list(offset, axis)
+        t0 = time.time()
+        for i in offset_list:
+            rest = max(timeout - (time.time() - t0), 0)
+            self.wait_until(bar, i, 0x0001, 0x0000, rest, size)
+        return
+
     def get_operate_condition(self, axis):
         data = self._get_extended_status(axis)
         data = [i[0:4][::-1] for i in data]
@@ -0,0 +1,111 @@
+"""
+開いたボードをプロセス内で共有するためのプールです。
+
+tools.open は同じ (バックエンド, ボード, RSW) に対して同じインスタンス
+(gpgXXXX またはドライバ) を返し、参照数を数えます。2 回目以降の open は
+辞書の参照だけで済み、シャドウレジスタも 1 つにまとまります。
+tools.release で参照を返し、最後の参照が返されたときにボードの
+finalize() (あれば) が呼ばれ、プールから取り除かれます。
+
+    >>> b1 = pyinterface.open(2724, 0)
+    >>> b2 = pyinterface.open(2724, 0)
+    >>> b1 is b2
+    True
+    >>> pyinterface.tools.release(b2)
+    >>> pyinterface.tools.release(b1)    # finalize
+"""
+
+import threading
+
+
+class board_pool(object):
+
+    def __init__(self):
+        self.entries = {}       # key -> [board, refcount]
+        self._keys = {}         # id(board) -> key
+        self._open_locks = {}   # key -> Lock held while the key is opened
+        self._lock = threading.RLock()
+        pass
+
+    def _take(self, key):
+        # board of key with refcount + 1, or None if not pooled
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry[1] += 1
+            return entry[0]
+
+    def acquire(self, key, open_board):
+        # pooled board of key (refcount + 1), opened by open_board() first;
+        # returns None if open_board() does. Boards of different keys are
+        # opened in parallel; opens of one key wait for the first.
+        if key in self.entries:
+            board = self._take(key)
+            if board is not None:
+                return board
+            pass
+        with self._lock:
+            open_lock = self._open_locks.setdefault(key, threading.Lock())
+            pass
+        with open_lock:
+            board = self._take(key)
+            if board is not None:
+                return board
+            board = open_board()
+            if board is None:
+                return None
+            with self._lock:
+                self.entries[key] = [board, 1]
+                self._keys[id(board)] = key
+                pass
+            pass
+        return board
+
+    def release(self, board):
+        # returns True when this was the last reference (board finalized)
+        with self._lock:
+            key = self._keys.get(id(board))
+            if key is None:
+                raise ValueError('board is not in the pool')
+            entry = self.entries[key]
+            entry[1] -= 1
+            if entry[1] > 0:
+                return False
+            del self.entries[key]
+            del self._keys[id(board)]
+            pass
+        finalize(board)
+        return True
+
+    def refcount(self, board):
+        key = self._keys.get(id(board))
+        if key is None:
+            return 0
+        return self.entries[key][1]
+
+    def clear(self):
+        # finalizes every board regardless of the reference counts
+        with self._lock:
+            boards = [entry[0] for entry in self.entries.values()]
+            self.entries = {}
+            self._keys = {}
+            pass
+        for board in boards:
+            finalize(board)
+            continue
+        return
+
+
+def finalize(board):
+    func = getattr(board, 'finalize', None)
+    if func is None:
+        func = getattr(getattr(board, 'driver', None), 'finalize', None)
+        pass
+    if func is not None:
+        func()
+        pass
+    return
+
+
+default_pool = board_pool()
@@ -0,0 +1,194 @@
+"""
+ドライバのメソッドの所要時間を、バスアクセス (バックエンドの read/write)、
+time.sleep、それ以外 (Python のオーバーヘッド) に分けて集計します。
+
+    >>> import pyinterface
+    >>> b = pyinterface.open(6204, 0)
+    >>> with pyinterface.profile() as p:
+    ...     for i in range(1000):
+    ...         b.get_counter(1)
+    >>> print(p.report())
+
+profile() の間、読み込み済みのドライバ (interface_driver のサブクラス) と
+gpgXXXX ラッパーの公開メソッドを計測用の関数に差し替えます。
+メソッドの時間は呼び出し先を含みます (gpg6204.get_counter の時間には
+pci6204_driver.read_counter の時間も含まれます)。計測用の関数自体の
+負荷 (1 呼び出しあたり 1 us 程度) はオーバーヘッドに含まれます。
+"""
+
+import sys
+import time
+import inspect
+import threading
+
+from . import core
+
+
+class method_stats(object):
+    __slots__ = ('calls', 'wall', 'bus', 'sleep')
+
+    def __init__(self):
+        self.calls = 0
+        self.wall = 0
+        self.bus = 0
+        self.sleep = 0
+        pass
+
+    @property
+    def overhead(self):
+        return self.wall - self.bus - self.sleep
+
+
+class profile(object):
+    # times are accumulated in ns per (board, method); board is the class
+    # name of the driver or wrapper and its board_id, e.g. 'gpg6204:0'
+
+    def __init__(self, classes=()):
+        self.classes = list(classes)
+        self.stats = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._patched = []
+        pass
+
+    # counters of the current thread: [bus, sleep] in ns
+    def _counters(self):
+        c = getattr(self._local, 'counters', None)
+        if c is None:
+            c = [0, 0]
+            self._local.counters = c
+            pass
+        return c
+
+    def target_classes(self):
+        classes = list(self.classes)
+        todo = [core.interface_driver]
+        while todo:
+            cls = todo.pop()
+            classes.append(cls)
+            todo.extend(cls.__subclasses__())
+            continue
+        for name, mod in list(sys.modules.items()):
+            if not name.startswith('pyinterface.gpg'):
+                continue
+            for cls in vars(mod).values():
+                if inspect.isclass(cls) and (cls.__module__ == name):
+                    classes.append(cls)
+                    pass
+                continue
+            continue
+        return list(dict.fromkeys(classes))
+
+    def _wrap_method(self, name, func):
+        prof = self
+        perf_counter_ns = time.perf_counter_ns
+
+        def wrapper(obj, *args, **kwargs):
+            c = prof._counters()
+            bus0, sleep0 = c
+            t0 = perf_counter_ns()
+            try:
+                return func(obj, *args, **kwargs)
+            finally:
+                wall = perf_counter_ns() - t0
+                prof._record(obj, name, wall, c[0] - bus0, c[1] - sleep0)
+                pass
+        wrapper.__name__ = func.__name__
+        wrapper.__qualname__ = func.__qualname__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def _wrap_timer(self, func, index):
+        prof = self
+        perf_counter_ns = time.perf_counter_ns
+
+        def wrapper(*args, **kwargs):
+            t0 = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                prof._counters()[index] += perf_counter_ns() - t0
+                pass
+        wrapper.__name__ = func.__name__
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def _record(self, obj, name, wall, bus, sleep):
+        board = '{0}:{1}'.format(type(obj).__name__,
+                                 getattr(obj, 'board_id', None))
+        with self._lock:
+            st = self.stats.get((board, name))
+            if st is None:
+                st = method_stats()
+                self.stats[(board, name)] = st
+                pass
+            st.calls += 1
+            st.wall += wall
+            st.bus += bus
+            st.sleep += sleep
+            pass
+        return
+
+    def _patch(self, owner, name, value):
+        self._patched.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, value)
+        return
+
+    def start(self):
+        for cls in self.target_classes():
+            for name, attr in list(vars(cls).items()):
+                if name.startswith('_') or not inspect.isfunction(attr):
+                    continue
+                self._patch(cls, name, self._wrap_method(name, attr))
+                continue
+            continue
+        for name in ('_bus_read', '_bus_read_into', '_bus_write'):
+            attr = vars(core.interface_driver)[name]
+            self._patch(core.interface_driver, name, self._wrap_timer(attr, 0))
+            continue
+        self._patch(time, 'sleep', self._wrap_timer(time.sleep, 1))
+        return self
+
+    def stop(self):
+        while self._patched:
+            owner, name, value = self._patched.pop()
+            setattr(owner, name, value)
+            continue
+        return
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+        return False
+
+    def to_dict(self):
+        # times in seconds; sorted by board, then by wall time
+        with self._lock:
+            items = sorted(self.stats.items(),
+                           key=lambda x: (x[0][0], -x[1].wall))
+            return [{
+                'board': board,
+                'method': name,
+                'calls': st.calls,
+                'wall': st.wall * 1e-9,
+                'bus': st.bus * 1e-9,
+                'sleep': st.sleep * 1e-9,
+                'overhead': st.overhead * 1e-9,
+            } for (board, name), st in items]
+
+    def report(self):
+        lines = ['{0:<16s} {1:<24s} {2:>8s} {3:>11s} {4:>11s} {5:>11s} {6:>11s}'
+                 .format('board', 'method', 'calls', 'wall [us]', 'bus [us]',
+                         'sleep [us]', 'other [us]')]
+        for d in self.to_dict():
+            n = d['calls']
+            lines.append(
+                '{0:<16s} {1:<24s} {2:>8d} {3:>11.2f} {4:>11.2f} {5:>11.2f} {6:>11.2f}'
+                .format(d['board'], d['method'], n, d['wall'] / n * 1e6,
+                        d['bus'] / n * 1e6, d['sleep'] / n * 1e6,
+                        d['overhead'] / n * 1e6))
+            continue
+        return '\n'.join(lines)
@@ -0,0 +1,319 @@
+"""
+ラック全体のボード設定をまとめて記述し、レジスタ書き込みの計画に
+変換して実行します。
+
+設定ファイル (JSON) には、ボードとそのボードで呼び出す設定メソッドを
+順に書きます。メソッドは tools.open が返すオブジェクト (gpgXXXX または
+ドライバ) のものです。
+
+    {"boards": [
+        {"name": "enc", "model": 6204, "rsw": 0,
+         "settings": [
+            {"method": "set_mode", "kwargs": {"mode": "MD0", "ch": 1}},
+            {"method": "set_z_mode", "kwargs": {"clear_condition": "CLS0", "ch": 1}}
+         ]},
+        {"name": "motor", "model": 7415, "rsw": 0,
+         "settings": [
+            {"method": "set_pulse_out", "args": ["xy", "method", [...]]}
+         ]}
+    ]}
+
+    >>> r = pyinterface.rack.rack(pyinterface.rack.load_config('rack.json'))
+    >>> plans = r.compile()
+    >>> r.apply(plans)
+
+compile() は各ボードの設定メソッドを、ボードのコピー (private_copy) 上で
+バスに書き込まずに実行 (dry-run) してレジスタの書き込みを記録し、
+以下のように最小化します。開いているボード (プールで共有されたもの) は
+変更しません。
+
+- always_write_registers (コマンド/データポート) への書き込みは
+  そのままの順で残し、その間の区間 (barrier の間) では同じバイトへの
+  書き込みを最後の値にまとめ、連続するバイトを 1 回の書き込みにします。
+- シャドウレジスタの値が有効 (set_write_suppression) で、同じ値の
+  書き込みは捨てます。
+- always_write_registers を読むメソッド (状態を待つ PPMC の設定など) は
+  dry-run できないので、そのメソッド以降はメソッドの呼び出しのまま
+  計画に残します。
+
+apply() はボードごとの計画をボードごとのスレッドで並列に実行します。
+"""
+
+import copy
+import json
+import time
+import concurrent.futures
+
+from . import tools
+
+
+class _unplannable(Exception):
+    pass
+
+
+def load_config(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class plan_backend(object):
+    # records the writes of a dry-run; reads are answered from the planned
+    # writes, else from the real backend (non-volatile registers only)
+
+    def __init__(self, driver, backend, shadow=None):
+        # shadow: (log_bytes_out, valid bytes) to drop redundant writes
+        self.driver = driver
+        self.backend = backend
+        self.shadow = shadow
+        self.volatile = driver.always_write_registers
+        self.ops = []           # ['w', bar_num, offset, bytes, volatile]
+        self.pending = {}       # (bar_num, offset) -> byte, since the last barrier
+        self.written = {}       # (bar_num, offset) -> byte, whole plan
+        pass
+
+    def bar_num(self, bar):
+        return self.driver.bar.index(bar)
+
+    def read(self, bar, offset, size):
+        bar_num = self.bar_num(bar)
+        keys = [(bar_num, o) for o in range(offset, offset+size)]
+        if any(k in self.volatile for k in keys):
+            raise _unplannable()
+        if all(k in self.written for k in keys):
+            return bytes(self.written[k] for k in keys)
+        d = bytearray(self.backend.read(bar, offset, size))
+        for i, k in enumerate(keys):
+            if k in self.written:
+                d[i] = self.written[k]
+                pass
+            continue
+        return bytes(d)
+
+    def write(self, bar, offset, data):
+        bar_num = self.bar_num(bar)
+        keys = [(bar_num, o) for o in range(offset, offset+len(data))]
+        for k, b in zip(keys, data):
+            self.written[k] = b
+            continue
+        if any(k in self.volatile for k in keys):
+            self.barrier()
+            self.ops.append(['w', bar_num, offset, bytes(data), True])
+            return
+        for k, b in zip(keys, data):
+            self.pending[k] = b
+            continue
+        return
+
+    def barrier(self):
+        # emits the pending writes as contiguous spans, except the bytes
+        # the (pre-plan) shadow already holds
+        pending, self.pending = self.pending, {}
+        span = None
+        for (bar_num, o) in sorted(pending):
+            b = pending[(bar_num, o)]
+            if self.redundant(bar_num, o, b):
+                continue
+            if (span is not None) and (span[1] == bar_num) \
+               and (span[2] + len(span[3]) == o):
+                span[3].append(b)
+                continue
+            span = ['w', bar_num, o, bytearray([b]), False]
+            self.ops.append(span)
+            continue
+        return
+
+    def redundant(self, bar_num, offset, b):
+        if self.shadow is None:
+            return False
+        log_out, valid = self.shadow
+        if (bar_num, offset) not in valid:
+            return False
+        return (offset < len(log_out[bar_num])) and (log_out[bar_num][offset] == b)
+
+    def snapshot(self):
+        return (len(self.ops), dict(self.pending), dict(self.written))
+
+    def restore(self, snapshot):
+        n, self.pending, self.written = snapshot
+        del self.ops[n:]
+        return
+
+
+class board_plan(object):
+    # ops: ['w', bar_num, offset, data, volatile],
+    #      ['state', {state_attributes of the driver after the writes}] or
+    #      ['call', method, args, kwargs] (run live)
+
+    def __init__(self, name, board):
+        self.name = name
+        self.board = board
+        self.driver = getattr(board, 'driver', board)
+        self.ops = []
+        pass
+
+    @property
+    def writes(self):
+        return sum(1 for op in self.ops if op[0] == 'w')
+
+    @property
+    def calls(self):
+        return sum(1 for op in self.ops if op[0] == 'call')
+
+    def execute(self):
+        driver = self.driver
+        with driver.lock():
+            for op in self.ops:
+                if op[0] == 'w':
+                    driver.write(op[1], op[2], bytes(op[3]))
+                elif op[0] == 'state':
+                    for name, value in op[1].items():
+                        setattr(driver, name, copy.deepcopy(value))
+                        continue
+                else:
+                    getattr(self.board, op[1])(*op[2], **op[3])
+                    pass
+                continue
+            pass
+        return
+
+    def __repr__(self):
+        return '<board_plan {0}: {1} writes, {2} calls>'.format(
+            self.name, self.writes, self.calls)
+
+
+def private_copy(board):
+    # copy of board (gpgXXXX or driver) with a private driver: own shadow,
+    # state attributes and no locks, so that a dry-run on it never touches
+    # the board, which may be shared through the pool
+    driver = getattr(board, 'driver', board)
+    with driver.lock():
+        shadow = driver.snapshot_shadow()
+        attrs = {k: copy.deepcopy(getattr(driver, k))
+                 for k in driver.state_attributes}
+        pass
+    private = copy.copy(driver)
+    private._bar_locks = None
+    private._shm_fd = None
+    private._shm_saved_locks = None
+    private._transaction = None
+    private.tracer = None
+    private.restore_shadow(shadow)
+    for k, v in attrs.items():
+        setattr(private, k, v)
+        continue
+    if board is driver:
+        return private, private
+    board = copy.copy(board)
+    board.driver = private
+    return board, private
+
+
+def compile_board(name, board, settings):
+    # dry-runs settings [(method, args, kwargs), ...] on a private_copy()
+    # of board; the board itself is not changed
+    plan = board_plan(name, board)
+    board, driver = private_copy(board)
+    rec = plan_backend(driver, driver.backend,
+                       driver.snapshot_shadow()[1:]
+                       if driver.suppress_redundant_writes else None)
+    driver.backend = rec
+
+    live = False
+    for method, args, kwargs in settings:
+        if not live:
+            snap = rec.snapshot()
+            attrs = {k: copy.deepcopy(getattr(driver, k))
+                     for k in driver.state_attributes}
+            try:
+                getattr(board, method)(*copy.deepcopy(args),
+                                       **copy.deepcopy(kwargs))
+                continue
+            except _unplannable:
+                rec.restore(snap)
+                rec.barrier()
+                rec.ops.append(['state', attrs])
+                live = True
+                pass
+            pass
+        rec.ops.append(['call', method, list(args), dict(kwargs)])
+        continue
+    if not live:
+        rec.barrier()
+        rec.ops.append(['state', {k: copy.deepcopy(getattr(driver, k))
+                                  for k in driver.state_attributes}])
+        pass
+    plan.ops = rec.ops
+    return plan
+
+
+def parse_settings(settings):
+    calls = []
+    for s in settings:
+        if isinstance(s, dict):
+            calls.append((s['method'], list(s.get('args', ())),
+                          dict(s.get('kwargs', {}))))
+        else:
+            method, *rest = s
+            args = rest[0] if len(rest) > 0 else ()
+            kwargs = rest[1] if len(rest) > 1 else {}
+            calls.append((method, list(args), dict(kwargs)))
+            pass
+        continue
+    return calls
+
+
+class rack(object):
+
+    def __init__(self, config, backend=None):
+        self.config = config
+        self.backend = backend
+        self.boards = {}
+        self.settings = {}
+        for b in config['boards']:
+            name = b.get('name', '{0}:{1}'.format(b['model'], b['rsw']))
+            board = tools.open(b['model'], b['rsw'],
+                               backend=b.get('backend', backend))
+            if board is None:
+                self.close()
+                msg = 'board {0} (RSW={1}) is not found'.format(
+                    b['model'], b['rsw'])
+                raise LookupError(msg)
+            self.boards[name] = board
+            self.settings[name] = parse_settings(b.get('settings', ()))
+            continue
+        pass
+
+    def compile(self):
+        return {name: compile_board(name, board, self.settings[name])
+                for name, board in self.boards.items()}
+
+    def apply(self, plans=None):
+        # executes the per-board plans in parallel; returns the elapsed time
+        if plans is None:
+            plans = self.compile()
+            pass
+        t0 = time.perf_counter()
+        if len(plans) > 1:
+            with concurrent.futures.ThreadPoolExecutor(len(plans)) as executor:
+                for f in [executor.submit(p.execute) for p in plans.values()]:
+                    f.result()
+                    continue
+                pass
+        else:
+            [p.execute() for p in plans.values()]
+            pass
+        return time.perf_counter() - t0
+
+    def close(self):
+        for board in self.boards.values():
+            tools.release(board)
+            continue
+        self.boards = {}
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
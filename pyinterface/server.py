@@ -0,0 +1,705 @@
+"""
+ボードを 1 つのプロセス (pyinterface-server) で開き、ローカルの複数の
+クライアントから Unix ドメインソケット経由で利用するためのサーバと
+クライアントです。
+
+ボードは tools.open で一度だけ開かれ、ボードごとに専用のスレッド
+(所有者) がドライバのメソッドを実行します。クライアントは応答を待たずに
+続けて要求を送る (パイプライン) ことも、複数の呼び出しを 1 フレームに
+まとめて送る (バッチ) こともできます。
+
+    $ pyinterface-server --socket /tmp/pyinterface.sock --board 2724:0
+
+    >>> import pyinterface.server
+    >>> c = pyinterface.server.connect('/tmp/pyinterface.sock')
+    >>> b = c.open(2724, 0)
+    >>> b.input_byte('IN1_8')
+    >>> with c.batch() as batch:
+    ...     f1 = batch.call(2724, 0, 'input_byte', 'IN1_8')
+    ...     f2 = batch.call(2724, 0, 'input_byte', 'IN9_16')
+    >>> f1.result(), f2.result()
+
+フレームは 4 バイト (little endian) の長さとペイロードからなり、
+ペイロードは encode/decode の型タグ付きバイナリです。
+
+    要求: [OP_CALL, id, board_name, board_id, method, args, kwargs]
+          [OP_BATCH, id, [[board_name, board_id, method, args, kwargs], ...]]
+    応答: [id, ok, value]  (バッチの value は [[ok, value], ...])
+
+ok が False のとき value は [例外の型名, メッセージ] です。
+
+method は 'name' (ボードのメソッド) か 'driver.name' (ドライバの
+メソッド) で、呼び出せるのはボードのクラスの公開メソッドと
+served_driver_methods だけです (served_methods)。状態の保存/復元、
+シャドウ、ロック、バックエンドなどは呼び出せません。
+"""
+
+import os
+import socket
+import struct
+import argparse
+import builtins
+import threading
+import collections
+import concurrent.futures
+
+from . import core
+from . import tools
+
+
+default_socket = os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR', '/tmp'), 'pyinterface.sock')
+
+OP_CALL = 0
+OP_BATCH = 1
+
+
+class RemoteError(Exception):
+    pass
+
+
+# encoding
+# --------
+
+_frame = struct.Struct('<I')
+_int = struct.Struct('<q')
+_float = struct.Struct('<d')
+_size = struct.Struct('<I')
+
+
+def encode(obj, out=None):
+    if out is None:
+        out = bytearray()
+        pass
+    if obj is None:
+        out += b'N'
+    elif obj is True:
+        out += b'T'
+    elif obj is False:
+        out += b'F'
+    elif isinstance(obj, int):
+        if -(1 << 63) <= obj < (1 << 63):
+            out += b'i'
+            out += _int.pack(obj)
+        else:
+            d = str(obj).encode()
+            out += b'I'
+            out += _size.pack(len(d))
+            out += d
+            pass
+    elif isinstance(obj, float):
+        out += b'f'
+        out += _float.pack(obj)
+    elif isinstance(obj, str):
+        d = obj.encode()
+        out += b's'
+        out += _size.pack(len(d))
+        out += d
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        out += b'b'
+        out += _size.pack(len(obj))
+        out += obj
+    elif isinstance(obj, core.flagged_bytes):
+        out += b'x'
+        encode(bytes(obj.bytes), out)
+        encode(list(obj.bit_flag), out)
+        encode(obj.fmt, out)
+    elif isinstance(obj, (list, tuple)):
+        out += b'l' if isinstance(obj, list) else b't'
+        out += _size.pack(len(obj))
+        for x in obj:
+            encode(x, out)
+            continue
+    elif isinstance(obj, dict):
+        out += b'd'
+        out += _size.pack(len(obj))
+        for k, v in obj.items():
+            encode(k, out)
+            encode(v, out)
+            continue
+    elif hasattr(obj, 'tolist'):
+        # numpy arrays and scalars
+        encode(obj.tolist(), out)
+    else:
+        msg = 'cannot encode {0}'.format(type(obj).__name__)
+        raise TypeError(msg)
+    return out
+
+
+def decode(buf):
+    obj, pos = _decode(memoryview(buf), 0)
+    return obj
+
+
+def _decode(buf, pos):
+    tag = buf[pos]
+    pos += 1
+    if tag == 0x4e:     # N
+        return None, pos
+    if tag == 0x54:     # T
+        return True, pos
+    if tag == 0x46:     # F
+        return False, pos
+    if tag == 0x69:     # i
+        return _int.unpack_from(buf, pos)[0], pos + 8
+    if tag == 0x66:     # f
+        return _float.unpack_from(buf, pos)[0], pos + 8
+    if tag in (0x49, 0x73, 0x62):   # I s b
+        n = _size.unpack_from(buf, pos)[0]
+        pos += 4
+        d = bytes(buf[pos:pos+n])
+        pos += n
+        if tag == 0x49:
+            return int(d), pos
+        if tag == 0x73:
+            return d.decode(), pos
+        return d, pos
+    if tag == 0x78:     # x
+        d, pos = _decode(buf, pos)
+        bit_flag, pos = _decode(buf, pos)
+        fmt, pos = _decode(buf, pos)
+        return core.flagged_bytes(d, bit_flag, fmt), pos
+    if tag in (0x6c, 0x74):     # l t
+        n = _size.unpack_from(buf, pos)[0]
+        pos += 4
+        items = []
+        for i in range(n):
+            x, pos = _decode(buf, pos)
+            items.append(x)
+            continue
+        if tag == 0x74:
+            return tuple(items), pos
+        return items, pos
+    if tag == 0x64:     # d
+        n = _size.unpack_from(buf, pos)[0]
+        pos += 4
+        items = {}
+        for i in range(n):
+            k, pos = _decode(buf, pos)
+            v, pos = _decode(buf, pos)
+            items[k] = v
+            continue
+        return items, pos
+    msg = 'bad tag 0x{0:02x} at {1}'.format(tag, pos - 1)
+    raise ValueError(msg)
+
+
+def send_frame(sock, obj):
+    d = encode(obj)
+    sock.sendall(_frame.pack(len(d)) + d)
+    return
+
+
+def recv_frame(sock):
+    # returns None at EOF
+    head = _recv_exact(sock, 4)
+    if head is None:
+        return None
+    d = _recv_exact(sock, _frame.unpack(head)[0])
+    if d is None:
+        raise ConnectionError('connection closed in the middle of a frame')
+    return decode(d)
+
+
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    pos = 0
+    while pos < size:
+        n = sock.recv_into(view[pos:])
+        if n == 0:
+            if pos == 0:
+                return None
+            raise ConnectionError('connection closed in the middle of a frame')
+        pos += n
+        continue
+    return buf
+
+
+# server
+# ------
+
+# interface_driver methods served besides the methods of the board
+# classes; the other ones (state, shadow, locking, backend, ...) are not
+served_driver_methods = frozenset([
+    'initialize', 'get_board_id', 'read', 'write', 'get_log', 'set_flag',
+    'update_flags', 'find_flag',
+])
+
+# plain attributes served as values
+served_attributes = frozenset(['board_id'])
+
+# board methods that the server itself manages
+unserved_methods = frozenset(['finalize'])
+
+_served_methods = {}
+
+
+def served_methods(cls):
+    # public methods of a gpgXXXX/pciXXXX_driver class that clients may call
+    names = _served_methods.get(cls)
+    if names is not None:
+        return names
+    names = set()
+    for c in cls.__mro__:
+        if c in (object, core.interface_driver):
+            continue
+        for name, value in vars(c).items():
+            if name.startswith('_') or not callable(value) \
+               or (name in unserved_methods):
+                continue
+            if (name in vars(core.interface_driver)) \
+               and (name not in served_driver_methods):
+                continue
+            names.add(name)
+            continue
+        continue
+    if issubclass(cls, core.interface_driver):
+        names |= served_driver_methods
+        pass
+    names = _served_methods[cls] = frozenset(names)
+    return names
+
+
+class board_server(object):
+    # boards are opened once and owned by a single-thread executor each;
+    # every connection has a reader (this thread) and a writer thread
+    # sending the replies in request order.
+
+    def __init__(self, path=default_socket, backend=None):
+        self.path = path
+        self.backend = backend
+        self.boards = {}
+        self._boards_lock = threading.Lock()
+        self.sock = None
+        self._closing = False
+        pass
+
+    def open_board(self, board_name, board_id):
+        # the board is opened outside _boards_lock, so that a slow open
+        # does not hold up the clients of the other boards
+        board_id = tools.normalize_board_id(board_id)
+        key = (board_name, board_id)
+        entry = self.boards.get(key)
+        if entry is not None:
+            return entry
+        board = tools.open(board_name, board_id, backend=self.backend)
+        if board is None:
+            msg = 'board {0} (RSW={1}) is not found'.format(board_name, board_id)
+            raise LookupError(msg)
+        with self._boards_lock:
+            entry = self.boards.get(key)
+            if (entry is None) and (not self._closing):
+                name = 'pyinterface-{0}-{1}'.format(board_name, board_id)
+                executor = concurrent.futures.ThreadPoolExecutor(1, name)
+                entry = self.boards[key] = (board, executor)
+                return entry
+            pass
+        # opened by another client meanwhile, or the server is closing
+        tools.release(board)
+        if entry is None:
+            raise ConnectionError('pyinterface-server is closing')
+        return entry
+
+    def submit(self, board_name, board_id, method, args, kwargs):
+        board, executor = self.open_board(board_name, board_id)
+        return executor.submit(self.invoke, board, method, args, kwargs)
+
+    def invoke(self, board, method, args, kwargs):
+        # only 'name' and 'driver.name' of served_methods() are called
+        obj = board
+        name = method
+        if method.startswith('driver.') and hasattr(board, 'driver'):
+            obj = board.driver
+            name = method[len('driver.'):]
+            pass
+        if name in served_attributes:
+            return getattr(obj, name)
+        if name not in served_methods(type(obj)):
+            msg = '{0} is not served'.format(method)
+            raise AttributeError(msg)
+        return getattr(obj, name)(*args, **kwargs)
+
+    def serve_forever(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+            pass
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen()
+        try:
+            while not self._closing:
+                try:
+                    conn, addr = self.sock.accept()
+                except OSError:
+                    break
+                t = threading.Thread(target=self.handle, args=(conn,),
+                                     daemon=True)
+                t.start()
+                continue
+        finally:
+            self.close()
+            pass
+        return
+
+    def handle(self, conn):
+        replies = collections.deque()
+        ready = threading.Condition()
+        writer = threading.Thread(target=self._write_replies,
+                                  args=(conn, replies, ready), daemon=True)
+        writer.start()
+        try:
+            while True:
+                try:
+                    req = recv_frame(conn)
+                except (ConnectionError, ValueError):
+                    break
+                if req is None:
+                    break
+                reply = self.dispatch(req)
+                with ready:
+                    replies.append(reply)
+                    ready.notify()
+                    pass
+                continue
+        finally:
+            with ready:
+                replies.append(None)
+                ready.notify()
+                pass
+            writer.join()
+            conn.close()
+            pass
+        return
+
+    def dispatch(self, req):
+        # returns (id, kind, futures) with futures already submitted; a
+        # malformed request is answered with an error (id None if the
+        # request has none)
+        if (not isinstance(req, list)) or (len(req) < 2):
+            return self._error(None, 'request must be [op, id, ...]')
+        op, req_id = req[0], req[1]
+        if op == OP_CALL:
+            return (req_id, OP_CALL, [self._submit(req[2:])])
+        if op == OP_BATCH:
+            if (len(req) != 3) or (not isinstance(req[2], list)):
+                return self._error(req_id, 'batch must be [op, id, [call, ...]]')
+            return (req_id, OP_BATCH, [self._submit(_) for _ in req[2]])
+        return self._error(req_id, 'bad op {0!r}'.format(op))
+
+    def _error(self, req_id, msg):
+        f = concurrent.futures.Future()
+        f.set_exception(ValueError(msg))
+        return (req_id, OP_CALL, [f])
+
+    def _submit(self, call):
+        try:
+            if (not isinstance(call, list)) or (len(call) != 5):
+                raise ValueError('call must be [board_name, board_id,'
+                                 ' method, args, kwargs]')
+            return self.submit(*call)
+        except Exception as e:
+            f = concurrent.futures.Future()
+            f.set_exception(e)
+            return f
+
+    def _write_replies(self, conn, replies, ready):
+        while True:
+            with ready:
+                while not replies:
+                    ready.wait()
+                    continue
+                reply = replies.popleft()
+                pass
+            if reply is None:
+                break
+            req_id, op, futures = reply
+            results = [self._result(_) for _ in futures]
+            try:
+                try:
+                    self._send_reply(conn, req_id, op, results)
+                except TypeError:
+                    # a value that cannot be encoded, reported per call
+                    results = [self._encodable(_) for _ in results]
+                    self._send_reply(conn, req_id, op, results)
+                    pass
+            except OSError:
+                break
+            continue
+        return
+
+    def _send_reply(self, conn, req_id, op, results):
+        if op == OP_CALL:
+            send_frame(conn, [req_id] + results[0])
+        else:
+            send_frame(conn, [req_id, True, results])
+            pass
+        return
+
+    def _result(self, future):
+        try:
+            return [True, future.result()]
+        except Exception as e:
+            return [False, [type(e).__name__, str(e)]]
+
+    def _encodable(self, result):
+        try:
+            encode(result)
+            return result
+        except TypeError as e:
+            return [False, [type(e).__name__, str(e)]]
+
+    def close(self):
+        self._closing = True
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+                pass
+            pass
+        with self._boards_lock:
+            for board, executor in self.boards.values():
+                executor.shutdown(wait=True)
+                tools.release(board)
+                continue
+            self.boards = {}
+            pass
+        return
+
+
+# client
+# ------
+
+class server_client(object):
+    # requests may be pipelined: submit() returns a Future right after
+    # the frame is sent, a reader thread resolves them as replies arrive
+
+    def __init__(self, path=default_socket):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.pending = {}
+        self._next_id = 0
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read_replies,
+                                        daemon=True)
+        self._reader.start()
+        pass
+
+    def _send(self, build):
+        # build(req_id) -> request; returns the Future of the reply
+        f = concurrent.futures.Future()
+        with self._send_lock:
+            req_id = self._next_id
+            self._next_id += 1
+            self.pending[req_id] = f
+            try:
+                send_frame(self.sock, build(req_id))
+            except BaseException:
+                del self.pending[req_id]
+                raise
+            pass
+        return f
+
+    def _read_replies(self):
+        error = ConnectionError('connection to pyinterface-server closed')
+        try:
+            while True:
+                reply = recv_frame(self.sock)
+                if reply is None:
+                    break
+                req_id, ok, value = reply
+                f = self.pending.pop(req_id, None)
+                if f is None:
+                    # not ours (error on a request without an id)
+                    continue
+                if ok:
+                    f.set_result(value)
+                else:
+                    f.set_exception(remote_error(value))
+                    pass
+                continue
+        except (OSError, ValueError) as e:
+            error = e
+            pass
+        for f in list(self.pending.values()):
+            f.set_exception(error)
+            continue
+        self.pending = {}
+        return
+
+    def submit(self, board_name, board_id, method, *args, **kwargs):
+        return self._send(lambda req_id: [OP_CALL, req_id, board_name, board_id,
+                                          method, list(args), kwargs])
+
+    def call(self, board_name, board_id, method, *args, **kwargs):
+        return self.submit(board_name, board_id, method, *args,
+                           **kwargs).result()
+
+    def batch(self):
+        return call_batch(self)
+
+    def open(self, board_name, board_id):
+        self.call(board_name, board_id, 'board_id')
+        return remote_board(self, board_name, board_id)
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        self._reader.join()
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+class call_batch(object):
+    # calls collected here are sent as one frame on exit (or send());
+    # the returned Futures are resolved with the batch reply
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+        self.futures = []
+        pass
+
+    def call(self, board_name, board_id, method, *args, **kwargs):
+        f = concurrent.futures.Future()
+        self.calls.append([board_name, board_id, method, list(args), kwargs])
+        self.futures.append(f)
+        return f
+
+    def send(self):
+        calls, futures = self.calls, self.futures
+        self.calls, self.futures = [], []
+        if not calls:
+            return
+        done = self.client._send(lambda req_id: [OP_BATCH, req_id, calls])
+        done.add_done_callback(lambda d: self._resolve(d, futures))
+        return
+
+    def _resolve(self, done, futures):
+        if done.exception() is not None:
+            for f in futures:
+                f.set_exception(done.exception())
+                continue
+            return
+        for f, (ok, value) in zip(futures, done.result()):
+            if ok:
+                f.set_result(value)
+            else:
+                f.set_exception(remote_error(value))
+                pass
+            continue
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+            pass
+        return False
+
+
+class remote_board(object):
+    # mirrors the board returned by tools.open (gpgXXXX or pciXXXX_driver);
+    # every attribute is called on the server, 'driver' gives the driver
+
+    def __init__(self, client, board_name, board_id, prefix=''):
+        self.client = client
+        self.board_name = board_name
+        self.board_id = board_id
+        self._prefix = prefix
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = self._prefix + name
+        if name == 'driver':
+            return remote_board(self.client, self.board_name, self.board_id,
+                                method + '.')
+
+        def call(*args, **kwargs):
+            return self.client.call(self.board_name, self.board_id, method,
+                                    *args, **kwargs)
+        call.__name__ = name
+        return call
+
+
+def remote_error(value):
+    name, msg = value
+    cls = getattr(core, name, None)
+    if not (isinstance(cls, type) and issubclass(cls, Exception)):
+        cls = getattr(builtins, name, None)
+        pass
+    if isinstance(cls, type) and issubclass(cls, Exception):
+        try:
+            return cls(msg)
+        except Exception:
+            pass
+        pass
+    return RemoteError('{0}: {1}'.format(name, msg))
+
+
+def connect(path=default_socket):
+    return server_client(path)
+
+
+# command line
+# ------------
+
+def main(argv=None):
+    p = argparse.ArgumentParser(
+        prog='pyinterface-server',
+        description='serve Interface PCI boards over a Unix domain socket')
+    p.add_argument('--socket', default=default_socket,
+                   help='socket path (default: %(default)s)')
+    p.add_argument('--board', action='append', default=[],
+                   metavar='NAME:RSW',
+                   help='open a board at start-up (RSW in hex: 0-F)')
+    p.add_argument('--backend', default=None,
+                   help="'pypci' (default), 'mmio' or 'sim'")
+    args = p.parse_args(argv)
+
+    boards = []
+    for b in args.board:
+        name, _, rsw = b.partition(':')
+        boards.append((int(name), int(rsw or '0', 16)))
+        continue
+
+    backend = args.backend
+    if backend == 'sim':
+        from . import sim
+        backend = sim.sim_backend()
+        for name, rsw in boards:
+            backend.add_board(name, rsw)
+            continue
+        pass
+
+    server = board_server(args.socket, backend)
+    for name, rsw in boards:
+        server.open_board(name, rsw)
+        continue
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+"""
+シャドウレジスタ (log_bytes_in/log_bytes_out) を共有メモリに置き、
+同じボードを開いた複数のプロセスで共有します。
+
+    >>> b = pyinterface.open(2724, 0)
+    >>> b.driver.set_shared_shadow()
+
+共有メモリは BAR のアドレスごとに作られ (pyinterface_<addr>_in/_out)、
+プロセスが終了しても残ります (再起動で消えます)。BAR ごとのロックは
+スレッド間 (RLock) とプロセス間 (ロックファイルのバイト範囲ロック) の
+両方を取るので、output_point などの read-modify-write は
+プロセスをまたいでも安全になります。
+"""
+
+import os
+import fcntl
+import threading
+from multiprocessing import shared_memory
+
+
+lock_dir = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+name_prefix = 'pyinterface'
+
+# lock files open in this process: path -> [fd, process_locks, users].
+# Closing any fd of a file drops every lockf lock of the process on it,
+# so the drivers of a board share one fd (and its locks) until the last
+# one leaves the shared shadow.
+_lock_files = {}
+_lock_files_lock = threading.Lock()
+
+
+class shm_shadow(object):
+    # bytearray-like view on a shared memory segment; slicing returns bytes
+
+    def __init__(self, shm):
+        self.shm = shm
+        self.buf = shm.buf
+        pass
+
+    def __len__(self):
+        return len(self.buf)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return bytes(self.buf[key])
+        return self.buf[key]
+
+    def __setitem__(self, key, value):
+        self.buf[key] = value
+        return
+
+    def __bytes__(self):
+        return bytes(self.buf)
+
+    def __eq__(self, other):
+        return bytes(self.buf) == bytes(other)
+
+    def extend(self, data):
+        raise ValueError('shared shadow is sized to the BAR and cannot grow')
+
+    def release(self):
+        self.buf = None
+        self.shm.close()
+        return
+
+
+class process_lock(object):
+    # re-entrant lock for threads (RLock) and processes (lockf on one byte
+    # of the board lock file, so each BAR locks independently)
+
+    def __init__(self, fd, index):
+        self.fd = fd
+        self.index = index
+        self._rlock = threading.RLock()
+        self._count = 0
+        pass
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._count == 0:
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, self.index)
+            except BaseException:
+                self._rlock.release()
+                raise
+            pass
+        self._count += 1
+        return True
+
+    def release(self):
+        self._count -= 1
+        if self._count == 0:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, self.index)
+            pass
+        self._rlock.release()
+        return
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+        return False
+
+
+def segment_name(bar, direction):
+    return '{0}_{1}{2:x}_{3}'.format(name_prefix, bar.type, bar.addr, direction)
+
+
+def open_segment(name, size):
+    # returns (SharedMemory, created)
+    try:
+        shm = shared_memory.SharedMemory(name, create=True, size=size,
+                                         **_untracked())
+        return shm, True
+    except FileExistsError:
+        pass
+    shm = shared_memory.SharedMemory(name, **_untracked())
+    return shm, False
+
+
+def _untracked():
+    # the segment must outlive the process that created it
+    try:
+        shared_memory.SharedMemory.__init__.__code__.co_varnames.index('track')
+        return {'track': False}
+    except ValueError:
+        return {}
+
+
+def _untrack(shm):
+    # python < 3.13 tracks every segment and unlinks it at exit
+    if 'track' in _untracked():
+        return
+    from multiprocessing import resource_tracker
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return
+
+
+def _unlink(shm):
+    # True if the segment was removed. SharedMemory.unlink() of
+    # python < 3.13 also unregisters the segment from resource_tracker,
+    # which does not track it here, so it is removed directly.
+    try:
+        if 'track' in _untracked():
+            shm.unlink()
+        else:
+            import _posixshmem
+            _posixshmem.shm_unlink(shm._name)
+            pass
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def open_lock_file(path, num_locks):
+    # (fd, process_locks) of the lock file, shared within the process
+    with _lock_files_lock:
+        entry = _lock_files.get(path)
+        if entry is None:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+            locks = [process_lock(fd, i) for i in range(num_locks)]
+            entry = _lock_files[path] = [fd, locks, 0]
+            pass
+        entry[2] += 1
+        return entry[0], entry[1]
+
+
+def close_lock_file(fd):
+    # closes the fd when its last user leaves
+    with _lock_files_lock:
+        for path, entry in _lock_files.items():
+            if entry[0] != fd:
+                continue
+            entry[2] -= 1
+            if entry[2] == 0:
+                del _lock_files[path]
+                os.close(fd)
+                pass
+            return
+        pass
+    return
+
+
+def share_shadow(driver):
+    bars = driver.bar
+    path = os.path.join(lock_dir, '{0}_{1}.lock'.format(
+        name_prefix, '_'.join('{0:x}'.format(_.addr) for _ in bars)))
+    fd, locks = open_lock_file(path, len(bars))
+
+    shadows = {'in': [], 'out': []}
+    for bar_num, bar in enumerate(bars):
+        with locks[bar_num]:
+            for direction, local in (('in', driver.log_bytes_in),
+                                     ('out', driver.log_bytes_out)):
+                size = max(bar.size, len(local[bar_num]))
+                shm, created = open_segment(segment_name(bar, direction), size)
+                _untrack(shm)
+                shadow = shm_shadow(shm)
+                if created:
+                    d = bytes(local[bar_num])
+                    shadow[0:len(d)] = d
+                    pass
+                shadows[direction].append(shadow)
+                continue
+            pass
+        continue
+
+    driver.log_bytes_in = shadows['in']
+    driver.log_bytes_out = shadows['out']
+    driver._shm_saved_locks = driver._bar_locks
+    driver._bar_locks = locks
+    driver._shm_fd = fd
+    return
+
+
+def unshare_shadow(driver, unlink=False):
+    # copies the shared shadow back into private bytearrays
+    log_in = [bytearray(bytes(_)) for _ in driver.log_bytes_in]
+    log_out = [bytearray(bytes(_)) for _ in driver.log_bytes_out]
+    for shadow in driver.log_bytes_in + driver.log_bytes_out:
+        shm = shadow.shm
+        shadow.release()
+        if unlink:
+            _unlink(shm)
+            pass
+        continue
+    driver.log_bytes_in = log_in
+    driver.log_bytes_out = log_out
+    # back to the locking the driver had before (thread-safe or not)
+    driver._bar_locks = driver._shm_saved_locks
+    driver._shm_saved_locks = None
+    close_lock_file(driver._shm_fd)
+    driver._shm_fd = None
+    return
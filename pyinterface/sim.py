@@ -0,0 +1,347 @@
+"""
+ハードウェアなしでドライバを動かすための、メモリ上の疑似 PCI ボードです。
+
+sim_backend は pypci と同じ lspci/read/write を持つバックエンドで、
+add_board() で追加したボードの PCI コンフィグヘッダ（ベンダ ID 0x1147）と
+bytearray の BAR を提供します。BAR の大きさは各ドライバの bit_flags
+テーブルから決まり、RSW はボード ID レジスタに書き込まれます。
+
+    >>> import pyinterface
+    >>> import pyinterface.sim
+    >>> sim = pyinterface.sim.sim_backend()
+    >>> sim.add_board(2724, rsw=1)
+    >>> b = pyinterface.open(2724, 1, backend=sim)
+
+ボードの動作はレジスタ単位のフック (board.read_hooks/board.write_hooks) で
+模擬します。pci3165/pci3177 の BUSY ビットと pci7204 の PPMC
+(OBF/IBF ハンドシェイク) のモデルは add_board() で自動的に登録されます。
+"""
+
+import collections
+import importlib
+
+from . import tools
+
+
+interface_vendor_id = 0x1147
+
+sim_base_addr = 0xf0000000
+sim_addr_step = 0x1000
+
+PCIConfigHeader = collections.namedtuple('PCIConfigHeader',
+                                         ['vendor_id',
+                                          'device_id',
+                                          'bar'])
+
+BaseAddressRegister = collections.namedtuple('BaseAddressRegister',
+                                             ['type',
+                                              'addr',
+                                              'size'])
+
+
+class BadAccessError(Exception):
+    pass
+
+
+class BoardNotFoundError(Exception):
+    pass
+
+
+# device_id: (driver module, driver class); the RSW register is in
+# tools.board_id_registers
+board_specs = {
+    2702: ('pci2702', 'pci2702_driver'),
+    2724: ('pci2724', 'pci2724_driver'),
+    3165: ('pci3165', 'pci3165_driver'),
+    3177: ('pci3177', 'pci3177_driver'),
+    3342: ('pci3342', 'pci3342_driver'),
+    3346: ('pci3346', 'pci3346_driver'),
+    3408: ('pci340816', 'pci340816_driver'),
+    340816: ('pci340816', 'pci340816_driver'),
+    3405: ('pci340516', 'pci340516_driver'),
+    6204: ('pci6204', 'pci6204_driver'),
+    7204: ('pci7204', 'pci7204_driver'),
+    7415: ('pci7415', 'pci7415_driver'),
+}
+
+
+def get_driver_class(device_id):
+    module_name, class_name = board_specs[device_id]
+    module = importlib.import_module('.' + module_name, __package__)
+    return getattr(module, class_name)
+
+
+def get_bar_sizes(driver_class):
+    tables_in = driver_class.bit_flags_in
+    tables_out = driver_class.bit_flags_out
+    sizes = []
+    for bar_num in range(max(len(tables_in), len(tables_out))):
+        size = 1
+        for tables in (tables_in, tables_out):
+            if bar_num < len(tables):
+                size = max(size, len(tables[bar_num]))
+                pass
+            continue
+        sizes.append(size)
+        continue
+    return sizes
+
+
+class sim_board(object):
+
+    def __init__(self, device_id, rsw=0, bar_sizes=None):
+        self.device_id = device_id
+        self.rsw = rsw
+
+        if bar_sizes is None:
+            bar_sizes = get_bar_sizes(get_driver_class(device_id))
+            pass
+        self.mem = [bytearray(size) for size in bar_sizes]
+        self.read_hooks = {}
+        self.write_hooks = {}
+        self.state = {}
+
+        if device_id in tools.board_id_registers:
+            bar_num, offset = tools.board_id_registers[device_id]
+            self.mem[bar_num][offset] = rsw & 0x0f
+            pass
+        pass
+
+    def read(self, bar_num, offset, size):
+        mem = self.mem[bar_num]
+        self._verify_access_range(mem, offset, size)
+        if self.read_hooks:
+            self._run_read_hooks(bar_num, offset, size)
+            pass
+        return bytes(mem[offset:offset+size])
+
+    def read_into(self, bar_num, offset, dst, pos, size):
+        mem = self.mem[bar_num]
+        self._verify_access_range(mem, offset, size)
+        if self.read_hooks:
+            self._run_read_hooks(bar_num, offset, size)
+            pass
+        dst[pos:pos+size] = mem[offset:offset+size]
+        return size
+
+    def write(self, bar_num, offset, data):
+        mem = self.mem[bar_num]
+        size = len(data)
+        self._verify_access_range(mem, offset, size)
+        mem[offset:offset+size] = data
+        if self.write_hooks:
+            for i, o in enumerate(range(offset, offset+size)):
+                hook = self.write_hooks.get((bar_num, o))
+                if hook is not None:
+                    hook(self, bar_num, o, data[i])
+                    pass
+                continue
+            pass
+        return
+
+    def _run_read_hooks(self, bar_num, offset, size):
+        for o in range(offset, offset+size):
+            hook = self.read_hooks.get((bar_num, o))
+            if hook is not None:
+                hook(self, bar_num, o)
+                pass
+            continue
+        return
+
+    def _verify_access_range(self, mem, offset, size):
+        if (offset < 0) or (offset + size > len(mem)):
+            msg = 'PCI addr space is 0-{0}'.format(hex(len(mem)-1))
+            msg += ' while tried to access {0}-{1}.'.format(hex(offset),
+                                                            hex(offset+size-1))
+            raise BadAccessError(msg)
+        return
+
+
+class sim_backend(object):
+
+    def __init__(self):
+        self.boards = []
+        self.headers = []
+        self._bars = {}
+        self._next_addr = sim_base_addr
+        pass
+
+    def add_board(self, device_id, rsw=0, bar_sizes=None):
+        board = sim_board(device_id, rsw, bar_sizes)
+        bars = []
+        for bar_num, mem in enumerate(board.mem):
+            bar = BaseAddressRegister('mem', self._next_addr, len(mem))
+            self._bars[bar] = (board, bar_num)
+            self._next_addr += sim_addr_step
+            bars.append(bar)
+            continue
+
+        model = board_models.get(device_id)
+        if model is not None:
+            model(board)
+            pass
+
+        self.boards.append(board)
+        self.headers.append(PCIConfigHeader(interface_vendor_id,
+                                            device_id, bars))
+        return board
+
+    def slot_name(self, conf):
+        # pseudo PCI slot for inventory records
+        return 'sim:{0}'.format(self.headers.index(conf))
+
+    def get_board(self, device_id, rsw):
+        for board in self.boards:
+            if (board.device_id == device_id) and (board.rsw == rsw):
+                return board
+            continue
+        msg = 'board {0} (RSW={1}) is not found'.format(device_id, rsw)
+        raise BoardNotFoundError(msg)
+
+    def lspci(self, vendor=None, device=None):
+        config = list(self.headers)
+
+        if vendor is not None:
+            config = [c for c in config if c.vendor_id==vendor]
+            pass
+
+        if device is not None:
+            config = [c for c in config if c.device_id==device]
+            pass
+
+        return config
+
+    def read(self, bar, offset, size):
+        board, bar_num = self._bars[bar]
+        return board.read(bar_num, offset, size)
+
+    def read_into(self, bar, offset, buf, pos=0, size=None):
+        dst = memoryview(buf).cast('B')
+        if size is None:
+            size = len(dst) - pos
+            pass
+        board, bar_num = self._bars[bar]
+        return board.read_into(bar_num, offset, dst, pos, size)
+
+    def write(self, bar, offset, data):
+        if not isinstance(data, (bytes, bytearray)):
+            raise TypeError('data must be bytes or bytearray')
+        board, bar_num = self._bars[bar]
+        board.write(bar_num, offset, data)
+        return
+
+
+# board models
+# ------------
+
+def model_adc_busy(board, busy_polls=2):
+    # pci3165/pci3177: writing the channel register (0x04) starts a
+    # conversion; the status register (0x03) bit 7 reads 0 (busy) for
+    # busy_polls reads, then 1 (idle) with the result in 0x00-0x01.
+    # Results are taken from board.state['ad'][channel code] (12 bit).
+    board.state['busy'] = 0
+    board.state['busy_polls'] = busy_polls
+    board.state['ad'] = {}
+    board.mem[0][0x03] |= 0x80
+
+    def on_start(board, bar_num, offset, value):
+        board.state['busy'] = board.state['busy_polls']
+        ad = board.state['ad'].get(value & 0x3f, 0x800)
+        board.mem[0][0x00:0x02] = ad.to_bytes(2, 'little')
+        board.mem[0][0x03] &= 0x7f
+        return
+
+    def on_status(board, bar_num, offset):
+        if board.state['busy'] > 0:
+            board.state['busy'] -= 1
+            return
+        board.mem[0][0x03] |= 0x80
+        return
+
+    board.write_hooks[(0, 0x04)] = on_start
+    board.read_hooks[(0, 0x03)] = on_status
+    return
+
+
+# command: number of data bytes returned
+ppmc_response_size = {
+    0b01000000: 1,
+    0b01000001: 1,
+    0b01000010: 3,
+    0b01000100: 1,
+    0b01000110: 1,
+}
+
+# command: number of data bytes consumed
+ppmc_argument_size = {
+    0b01000011: 3,
+    0b01000101: 1,
+}
+
+def model_ppmc(board):
+    # pci7204: BAR 1/2 (axis 1/2) offset 0 is the PPMC data port and
+    # offset 1 the command/status port (OBF=bit 0, IBF=bit 1). Commands
+    # queue their reply bytes; OBF is set while the queue is not empty.
+    # The counter (get/set_counter) is kept in board.state['counter'].
+    board.state['counter'] = [0, 0]
+    for axis in (1, 2):
+        _install_ppmc(board, axis)
+        continue
+    return
+
+
+def _install_ppmc(board, axis):
+    st = {'out': collections.deque(), 'cmd': None, 'arg': b''}
+
+    def update_status(board):
+        board.mem[axis][0x01] = 0x01 if st['out'] else 0x00
+        return
+
+    def on_command(board, bar_num, offset, value):
+        st['cmd'] = value
+        st['arg'] = b''
+        if value == 0b01000010:
+            reply = board.state['counter'][axis-1].to_bytes(3, 'little')
+        else:
+            reply = bytes(ppmc_response_size.get(value, 0))
+            pass
+        st['out'].extend(reply)
+        update_status(board)
+        return
+
+    def on_data_write(board, bar_num, offset, value):
+        st['arg'] += bytes([value])
+        if len(st['arg']) == ppmc_argument_size.get(st['cmd'], 0):
+            if st['cmd'] == 0b01000011:
+                ct = int.from_bytes(st['arg'], 'little')
+                board.state['counter'][axis-1] = ct
+                pass
+            st['cmd'] = None
+            st['arg'] = b''
+            pass
+        update_status(board)
+        return
+
+    def on_data_read(board, bar_num, offset):
+        if st['out']:
+            board.mem[axis][0x00] = st['out'].popleft()
+            pass
+        update_status(board)
+        return
+
+    def on_status_read(board, bar_num, offset):
+        update_status(board)
+        return
+
+    board.write_hooks[(axis, 0x01)] = on_command
+    board.write_hooks[(axis, 0x00)] = on_data_write
+    board.read_hooks[(axis, 0x00)] = on_data_read
+    board.read_hooks[(axis, 0x01)] = on_status_read
+    return
+
+
+board_models = {
+    3165: model_adc_busy,
+    3177: model_adc_busy,
+    7204: model_ppmc,
+}
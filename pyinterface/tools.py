@@ -1,79 +1,115 @@
-import pypci
-
-from . import gpg2000
-from . import gpg3100
-from . import gpg3300
-from . import gpg6204
-from . import gpg7204
-from . import gpg7400
-
-from . import pci2702
-from . import pci2724
-from . import pci3165
-from . import pci3177
-from . import pci3342
-from . import pci3346
-from . import pci340816
-from . import pci340516
-from . import pci6204
-from . import pci7204
-from . import pci7415
+import os
+import importlib
+import warnings
+
+from . import backend as _backend
+from . import discovery as _discovery
+from . import pool as _pool
+
+# board and wrapper modules are imported by the open functions on first
+# use; "import pyinterface" does not load them
+board_modules = (
+    'gpg2000', 'gpg3100', 'gpg3300', 'gpg6204', 'gpg7204', 'gpg7400',
+    'pci2702', 'pci2724', 'pci3165', 'pci3177', 'pci3342', 'pci3346',
+    'pci340816', 'pci340516', 'pci6204', 'pci7204', 'pci7415',
+)
+
+# device id -> (bar_num, offset) of the board ID (RSW) register, whose
+# low nibble is driver.board_id (used by inventory and sim)
+board_id_registers = {
+    2702: (0, 0x0f),
+    2724: (0, 0x0f),
+    3165: (0, 0x17),
+    3177: (0, 0x17),
+    3342: (0, 0x17),
+    3346: (0, 0x17),
+    3408: (0, 0x17),
+    340816: (0, 0x17),
+    3405: (0, 0x17),
+    6204: (1, 0x0f),
+    7204: (0, 0x07),
+    7415: (0, 0x0f),
+}
+
+# entry point group of third-party boards: name = device id,
+# value = open function (pci_config_header, backend) -> board
+entry_point_group = 'pyinterface.boards'
+
+
+def __getattr__(name):
+    # tools.pci2724 etc. as before the lazy loading
+    if name in board_modules:
+        return importlib.import_module('.' + name, __package__)
+    msg = 'module {0!r} has no attribute {1!r}'.format(__name__, name)
+    raise AttributeError(msg)
+
 
 interface_vendor_id = 0x1147
 
 
-def open2702(pci_config_header):
-    driver = pci2702.pci2702_driver(pci_config_header)
+def open2702(pci_config_header, backend=None):
+    from . import pci2702, gpg2000
+    driver = pci2702.pci2702_driver(pci_config_header, backend)
     return gpg2000.gpg2000(driver)
 
 
-def open2724(pci_config_header):
-    driver = pci2724.pci2724_driver(pci_config_header)
+def open2724(pci_config_header, backend=None):
+    from . import pci2724, gpg2000
+    driver = pci2724.pci2724_driver(pci_config_header, backend)
     return gpg2000.gpg2000(driver)
 
 
-def open3165(pci_config_header):
-    driver = pci3165.pci3165_driver(pci_config_header)
+def open3165(pci_config_header, backend=None):
+    from . import pci3165
+    driver = pci3165.pci3165_driver(pci_config_header, backend)
     return driver
 
 
-def open3177(pci_config_header):
-    driver = pci3177.pci3177_driver(pci_config_header)
+def open3177(pci_config_header, backend=None):
+    from . import pci3177, gpg3100
+    driver = pci3177.pci3177_driver(pci_config_header, backend)
     return gpg3100.gpg3100(driver)
 
 
-def open3342(pci_config_header):
-    driver = pci3342.pci3342_driver(pci_config_header)
+def open3342(pci_config_header, backend=None):
+    from . import pci3342
+    driver = pci3342.pci3342_driver(pci_config_header, backend)
     return driver
 
 
-def open3346(pci_config_header):
-    driver = pci3346.pci3346_driver(pci_config_header)
+def open3346(pci_config_header, backend=None):
+    from . import pci3346, gpg3300
+    driver = pci3346.pci3346_driver(pci_config_header, backend)
     return gpg3300.gpg3300(driver)
 
 
-def open3408(pci_config_header):
-    driver = pci340816.pci340816_driver(pci_config_header)
+def open3408(pci_config_header, backend=None):
+    from . import pci340816
+    driver = pci340816.pci340816_driver(pci_config_header, backend)
     return driver
 
 
-def open3405(pci_config_header):
-    driver = pci340516.pci340516_driver(pci_config_header)
+def open3405(pci_config_header, backend=None):
+    from . import pci340516
+    driver = pci340516.pci340516_driver(pci_config_header, backend)
     return driver
 
 
-def open6204(pci_config_header):
-    driver = pci6204.pci6204_driver(pci_config_header)
+def open6204(pci_config_header, backend=None):
+    from . import pci6204, gpg6204
+    driver = pci6204.pci6204_driver(pci_config_header, backend)
     return gpg6204.gpg6204(driver)
 
 
-def open7204(pci_config_header):
-    driver = pci7204.pci7204_driver(pci_config_header)
+def open7204(pci_config_header, backend=None):
+    from . import pci7204, gpg7204
+    driver = pci7204.pci7204_driver(pci_config_header, backend)
     return gpg7204.gpg7204(driver)
 
 
-def open7415(pci_config_header):
-    driver = pci7415.pci7415_driver(pci_config_header)
+def open7415(pci_config_header, backend=None):
+    from . import pci7415, gpg7400
+    driver = pci7415.pci7415_driver(pci_config_header, backend)
     return gpg7400.gpg7400(driver)
 
 
@@ -92,41 +128,220 @@ open_func = {
     7415: open7415,
 }
 
+_entry_points = None
+
 
-def open(board_name, board_id):
+def register_board(device_id, func):
+    open_func[device_id] = func
+    return
+
+
+def load_entry_points():
+    # device id -> EntryPoint of the installed third-party boards
+    global _entry_points
+    try:
+        from importlib.metadata import entry_points
+    except ImportError:
+        from importlib_metadata import entry_points
+        pass
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group=entry_point_group)
+    else:
+        eps = eps.get(entry_point_group, [])
+        pass
+    found = {}
+    for ep in eps:
+        try:
+            device_id = int(ep.name)
+        except ValueError:
+            msg = 'entry point {0} = {1} of {2} is ignored:'.format(
+                ep.name, ep.value, entry_point_group)
+            msg += ' the name must be a device id'
+            warnings.warn(msg, RuntimeWarning)
+            continue
+        found[device_id] = ep
+        continue
+    _entry_points = found
+    return _entry_points
+
+
+def get_open_func(board_name):
+    func = open_func.get(board_name)
+    if func is not None:
+        return func
+    if _entry_points is None:
+        load_entry_points()
+        pass
+    ep = _entry_points.get(board_name)
+    if ep is None:
+        msg = 'unknown board {0}'.format(board_name)
+        raise KeyError(msg)
+    func = ep.load()
+    register_board(board_name, func)
+    return func
+
+
+def normalize_board_id(board_id):
+    # RSW as driver.board_id gives it: one lower-case hex digit
     if type(board_id) == int:
-        board_id = format(board_id, "1X")
+        return format(board_id, "1x")
+    return str(board_id).lower()
+
+
+def open(board_name, board_id, backend=None, state_file=None, cache=None,
+         pool=None):
+    # the board is shared through pool (default: pool.default_pool) by
+    # every open of the same (backend, board_name, board_id), until the
+    # last release(); pool=False opens a new, unshared instance. Pooled
+    # drivers are thread safe (set_thread_safe), which adds a lock to
+    # every register access; use pool=False for a board used by a single
+    # thread that should not pay for it. state_file is restored
+    # only by the open that opens the board; ValueError is raised if the
+    # board is already in the pool.
+    # cache: discovery.discovery_cache of the slots already probed
+    # (default: an in-memory cache per backend; not used by a pool hit)
+    board_id = normalize_board_id(board_id)
+
+    if pool is False:
+        return _open(board_name, board_id, backend, state_file, cache)
+    if pool is None:
+        pool = _pool.default_pool
+        pass
+    if isinstance(backend, str):
+        backend_key = backend
+    else:
+        backend_key = _backend.get_backend(backend)
         pass
 
-    pci_config_headers = pypci.lspci(interface_vendor_id, board_name)
+    opened = []
+    def open_board():
+        b = _open(board_name, board_id, backend, state_file, cache)
+        if b is not None:
+            set_thread_safe = getattr(getattr(b, 'driver', b),
+                                      'set_thread_safe', None)
+            if set_thread_safe is not None:
+                set_thread_safe()
+                pass
+            pass
+        opened.append(b)
+        return b
+
+    b = pool.acquire((backend_key, board_name, board_id), open_board)
+    if (b is not None) and (state_file is not None) and (opened == []):
+        pool.release(b)
+        msg = 'board {0} (RSW={1}) is already open;'.format(board_name, board_id)
+        msg += ' state_file is restored only when the board is opened'
+        msg += ' (release it first, or use pool=False)'
+        raise ValueError(msg)
+    return b
+
+
+def release(board, pool=None):
+    # returns a board of open(); the last release calls its finalize()
+    if pool is None:
+        pool = _pool.default_pool
+        pass
+    return pool.release(board)
+
+
+def _open(board_name, board_id, backend, state_file, cache):
+    backend = _backend.get_backend(backend)
+    pci_config_headers = backend.lspci(interface_vendor_id, board_name)
 
     if pci_config_headers == []:
         msg = "board_id {0} is not found".format(board_name)
         raise TypeError(msg)
 
-    for conf in pci_config_headers:
-        b = open_func[board_name](conf)
+    if cache is None:
+        cache = _discovery.get_cache(backend)
+        pass
+    cache.validate(board_name, pci_config_headers)
+    open_board = get_open_func(board_name)
+
+    try:
+        b = _open_cached(open_board, pci_config_headers, board_id, backend,
+                         cache)
+    finally:
+        cache.save()
+        pass
+
+    if (b is not None) and (state_file is not None):
+        try:
+            restore_state(b, state_file)
+        except BaseException:
+            # not in the pool yet: nobody else will finalize it
+            _pool.finalize(b)
+            raise
+        pass
+    return b
+
+
+def _open_cached(open_board, pci_config_headers, board_id, backend, cache):
+    # slots known to have board_id first, then the slots not probed yet
+    probed = set()
+    for i, conf in enumerate(pci_config_headers):
+        if cache.lookup(conf) == board_id:
+            b = open_board(conf, backend)
+            if b.board_id == board_id:
+                return b
+            cache.store(conf, b.board_id)
+            probed.add(i)
+            pass
+        continue
+
+    skipped = []
+    for i, conf in enumerate(pci_config_headers):
+        if i in probed:
+            continue
+        if cache.lookup(conf) is not None:
+            skipped.append(conf)
+            continue
+        b = open_board(conf, backend)
+        cache.store(conf, b.board_id)
         if b.board_id == board_id:
             return b
         continue
-    return
 
+    # not found: the recorded RSW of the other slots may be stale
+    for conf in skipped:
+        b = open_board(conf, backend)
+        cache.store(conf, b.board_id)
+        if b.board_id == board_id:
+            return b
+        continue
+    return
 
-def lspci():
-    pci_config_headers = pypci.lspci(interface_vendor_id)
 
-    if pci_config_headers == []:
-        msg = "board_id {0} is not found".format(board_name)
-        raise TypeError(msg)
+def restore_state(board, state_file):
+    # warm restart: restores the state saved by save_state() if the file
+    # exists and matches the board; check board.driver.state_restored and
+    # call initialize() when it is False
+    driver = getattr(board, 'driver', board)
+    if not os.path.exists(state_file):
+        return False
+    return driver.restore_state(state_file)
 
-    board_list = []
-    for conf in lpci_config_headers:
-        board_name = conf.device_id
-        b = open_func[board_name](conf)
-        board_list.append({"name": board_name, "rsw": b.board_id})
-        continue
 
-    for b in sorted(board_list, key=lambda x: x["name"]):
-        print("%s : RSW=%s" % (b["name"], b["rsw"]))
-        continue
+def save_state(board, state_file):
+    driver = getattr(board, 'driver', board)
+    tmp = state_file + '.tmp'
+    driver.save_state(tmp)
+    os.replace(tmp, state_file)
     return
+
+
+def lspci(backend=None, verbose=True):
+    # inventory.inventory() records; printed as "name : RSW=x" if verbose
+    from . import inventory
+    board_list = inventory.inventory(backend)
+
+    if verbose:
+        for b in board_list:
+            if b["error"] is not None:
+                print("%s : ERROR %s" % (b["device_id"], b["error"]))
+                continue
+            print("%s : RSW=%s" % (b["device_id"], b["rsw"]))
+            continue
+        pass
+    return board_list
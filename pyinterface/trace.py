@@ -0,0 +1,182 @@
+"""
+レジスタアクセスの計測を行います。
+
+access_tracer を interface_driver の tracer 属性に設定すると、バックエンドの
+read/write（および set_flag の呼び出し）を (ボード, 種別, BAR, offset)
+ごとに集計し、バスアクセスの所要時間を HDR 形式（対数線形）の
+ヒストグラムに記録します。ring_size を指定すると、直近のアクセスを
+その数だけ保持します。tracer が None（既定）の場合の負荷は属性の参照
+1 回のみです。
+
+    >>> import pyinterface.trace
+    >>> t = pyinterface.trace.enable(ring_size=1000)   # 全ドライバ
+    >>> b.driver.tracer = pyinterface.trace.access_tracer()   # 1 ボードのみ
+    >>> t.to_dict()
+    >>> t.dump('trace.json')
+"""
+
+import time
+import json
+import collections
+import threading
+
+
+class latency_histogram(object):
+    # log-linear buckets: values below 2**sub_bucket_bits are exact, above
+    # that every power of two is split into 2**(sub_bucket_bits-1) buckets,
+    # i.e. the relative error is below 2**-(sub_bucket_bits-1).
+
+    def __init__(self, sub_bucket_bits=5):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+        pass
+
+    def bucket_index(self, value):
+        sb = self.sub_bucket_bits
+        shift = value.bit_length() - sb
+        if shift <= 0:
+            return value
+        return (shift << (sb - 1)) + (value >> shift)
+
+    def bucket_value(self, index):
+        sb = self.sub_bucket_bits
+        if index < (1 << sb):
+            return index
+        shift = (index >> (sb - 1)) - 1
+        return (index - (shift << (sb - 1))) << shift
+
+    def record(self, value):
+        i = self.bucket_index(value)
+        self.counts[i] = self.counts.get(i, 0) + 1
+        self.count += 1
+        self.total += value
+        if (self.min is None) or (value < self.min):
+            self.min = value
+            pass
+        if (self.max is None) or (value > self.max):
+            self.max = value
+            pass
+        return
+
+    def percentile(self, p):
+        if self.count == 0:
+            return None
+        target = max(1, -(-self.count * p // 100))
+        n = 0
+        for i in sorted(self.counts):
+            n += self.counts[i]
+            if n >= target:
+                return min(self.bucket_value(i), self.max)
+            continue
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.total / self.count if self.count else None,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'buckets': {self.bucket_value(i): c
+                        for i, c in sorted(self.counts.items())},
+        }
+
+
+class access_tracer(object):
+    # stats: {(board, kind, bar_num, offset): [calls, bytes, histogram]}
+    # with latencies in ns; kind is 'read', 'write' or 'set_flag'
+    # (set_flag is counted only, its bus time is traced as a 'write').
+
+    def __init__(self, ring_size=0, sub_bucket_bits=5):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.stats = {}
+        self.ring = collections.deque(maxlen=ring_size) if ring_size else None
+        self._lock = threading.Lock()
+        pass
+
+    def board_name(self, driver):
+        name = type(driver).__name__
+        if name.endswith('_driver'):
+            name = name[:-len('_driver')]
+            pass
+        return '{0}:{1}'.format(name, getattr(driver, 'board_id', None))
+
+    def record(self, driver, kind, bar_num, offset, data, elapsed):
+        key = (self.board_name(driver), kind, bar_num, offset)
+        with self._lock:
+            st = self.stats.get(key)
+            if st is None:
+                st = [0, 0, latency_histogram(self.sub_bucket_bits)]
+                self.stats[key] = st
+                pass
+            st[0] += 1
+            st[1] += len(data)
+            if elapsed is not None:
+                st[2].record(elapsed)
+                pass
+            if self.ring is not None:
+                self.ring.append((time.time(), key[0], kind, bar_num, offset,
+                                  bytes(data), elapsed))
+                pass
+            pass
+        return
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+            if self.ring is not None:
+                self.ring.clear()
+                pass
+            pass
+        return
+
+    def to_dict(self):
+        with self._lock:
+            registers = [{
+                'board': board,
+                'kind': kind,
+                'bar': bar_num,
+                'offset': offset,
+                'calls': st[0],
+                'bytes': st[1],
+                'latency_ns': st[2].to_dict(),
+            } for (board, kind, bar_num, offset), st
+              in sorted(self.stats.items(), key=lambda x: -x[1][2].total)]
+            ring = [{
+                'time': t,
+                'board': board,
+                'kind': kind,
+                'bar': bar_num,
+                'offset': offset,
+                'data': data.hex(),
+                'latency_ns': elapsed,
+            } for t, board, kind, bar_num, offset, data, elapsed
+              in (self.ring or ())]
+            pass
+        return {'registers': registers, 'ring': ring}
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=1)
+            pass
+        return
+
+
+def enable(ring_size=0, sub_bucket_bits=5):
+    from .core import interface_driver
+    tracer = access_tracer(ring_size, sub_bucket_bits)
+    interface_driver.tracer = tracer
+    return tracer
+
+
+def disable():
+    from .core import interface_driver
+    interface_driver.tracer = None
+    return
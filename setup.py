@@ -28,6 +28,12 @@ setuptools.setup(
         'psutil',
         "importlib-metadata; python_version < '3.8'"
     ],
+    entry_points = {
+        'console_scripts': [
+            'pyinterface-server = pyinterface.server:main',
+            'pyinterface-lspci = pyinterface.inventory:main',
+        ],
+    },
     classifiers=[
         'Operating System :: POSIX :: Linux',
         'Programming Language :: Python',
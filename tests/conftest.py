@@ -0,0 +1,47 @@
+import pytest
+
+from pyinterface import sim
+from pyinterface import tools
+
+
+class recording_backend(object):
+    # sim_backend recording every bus access as
+    # (kind, bar address, offset, bytes written or size read)
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.log = []
+        pass
+
+    def lspci(self, vendor=None, device=None):
+        return self.backend.lspci(vendor, device)
+
+    def read(self, bar, offset, size):
+        self.log.append(('r', bar.addr, offset, size))
+        return self.backend.read(bar, offset, size)
+
+    def write(self, bar, offset, data):
+        self.log.append(('w', bar.addr, offset, bytes(data)))
+        return self.backend.write(bar, offset, data)
+
+    def writes(self):
+        return [(offset, data) for kind, addr, offset, data in self.log
+                if kind == 'w']
+
+
+@pytest.fixture
+def backend():
+    return sim.sim_backend()
+
+
+@pytest.fixture
+def open_board(backend):
+    # opens an unpooled board on a fresh sim_backend; returns the driver
+    # and the recording backend it talks through
+    def open_board(device_id, rsw=0):
+        backend.add_board(device_id, rsw)
+        rec = recording_backend(backend)
+        b = tools.open(device_id, rsw, backend=rec, pool=False)
+        rec.log = []
+        return getattr(b, 'driver', b), rec
+    return open_board
@@ -0,0 +1,137 @@
+import random
+import struct
+
+import pytest
+
+from pyinterface import core
+
+
+# previous implementation (string formatting), kept as the reference
+# ------------------------------------------------------------------
+
+def old_bytes2bit(bytes_data):
+    return ''.join([format(byte, '08b')[::-1] for byte in bytes_data])
+
+def old_bit2bytes(bit_str):
+    bit_str += ('0' * ((8 - len(bit_str)) % 8))
+    d = b''
+    for i in range(int(len(bit_str)/8)):
+        bb = bit_str[8*i:8*(i+1)]
+        d += int(bb[::-1], 2).to_bytes(1, 'little')
+        continue
+    return d
+
+def old_bytes2list(bytes_data):
+    return list(map(int, old_bytes2bit(bytes_data)))
+
+def old_list2bytes(bit_list):
+    return old_bit2bytes(''.join(map(str, bit_list)))
+
+
+class old_flagged_bytes(object):
+
+    def __init__(self, bytes, bit_flag=(), fmt=''):
+        self.bytes = bytes
+        self.bit_flag = bit_flag
+        self.fmt = fmt
+        pass
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            for item in self.to_dictlist():
+                if item['flag'] == key:
+                    return item['value']
+                continue
+            return None
+        return self.to_list()[key]
+
+    def to_hex(self):
+        return self.bytes.hex()
+
+    def to_bit(self):
+        return old_bytes2bit(self.bytes)
+
+    def to_list(self):
+        return old_bytes2list(self.bytes)
+
+    def to_dictlist(self):
+        bit = self.to_list()
+        flag_list = [f for flags in self.bit_flag for f in flags]
+        return [{'index': i, 'flag': f, 'value': b} for i, (b, f)
+                in enumerate(zip(bit, flag_list))]
+
+    def to_int(self):
+        codes = {1: '<b', 2: '<h', 4: '<i', 8: '<q'}
+        if len(self.bytes) not in codes:
+            return 0
+        return struct.unpack(codes[len(self.bytes)], self.bytes)[0]
+
+    def to_uint(self):
+        codes = {1: '<B', 2: '<H', 4: '<I', 8: '<Q'}
+        if len(self.bytes) not in codes:
+            return 0
+        return struct.unpack(codes[len(self.bytes)], self.bytes)[0]
+
+    def to_flags(self):
+        return ' '.join([item['flag'] for item in self.to_dictlist()
+                         if item['value'] == 1])
+
+
+def test_flagged_bytes_matches_previous_implementation():
+    from pyinterface import pci2724
+    table = pci2724.pci2724_driver.bit_flags_in[0]
+    rng = random.Random(0)
+    for offset in range(len(table) - 1):
+        for size in (1, 2):
+            flags = table[offset:offset+size]
+            names = [f for fs in flags for f in fs if f != '']
+            for _ in range(20):
+                data = bytes(rng.getrandbits(8) for _ in range(size))
+                new = core.flagged_bytes(data, flags)
+                old = old_flagged_bytes(data, flags)
+                assert new.to_list() == old.to_list()
+                assert new.to_bit() == old.to_bit()
+                assert new.to_hex() == old.to_hex()
+                assert new.to_flags() == old.to_flags()
+                assert new.to_int() == old.to_int()
+                assert new.to_uint() == old.to_uint()
+                assert new.to_dictlist() == old.to_dictlist()
+                for i in range(8 * size):
+                    assert new[i] == old[i]
+                    continue
+                for name in names + ['NOT_A_FLAG']:
+                    assert new[name] == old[name]
+                    continue
+                continue
+            continue
+        continue
+    return
+
+
+sizes = [0, 1, 2, 3, 4, 8, 64]
+
+
+@pytest.mark.parametrize('size', sizes)
+def test_codec_matches_previous_implementation(size):
+    rng = random.Random(size)
+    for _ in range(50):
+        data = bytes(rng.getrandbits(8) for _ in range(size))
+        bits = old_bytes2bit(data)
+        assert core.bytes2bit(data) == bits
+        assert core.bytes2list(data) == old_bytes2list(data)
+        assert core.bit2bytes(bits) == old_bit2bytes(bits)
+        assert core.list2bytes(old_bytes2list(data)) == data
+        continue
+    return
+
+
+def test_codec_pads_partial_bytes():
+    for n in range(1, 20):
+        bits = ''.join(random.choice('01') for _ in range(n))
+        assert core.bit2bytes(bits) == old_bit2bytes(bits)
+        bit_list = [int(b) for b in bits]
+        assert core.list2bytes(bit_list) == old_list2bytes(bit_list)
+        assert core.list2int(bit_list) == int.from_bytes(
+            old_list2bytes(bit_list), 'little')
+        continue
+    return
@@ -0,0 +1,78 @@
+from pyinterface import discovery
+from pyinterface import sim
+from pyinterface import tools
+
+
+def test_open_probes_and_records_slots(backend):
+    backend.add_board(2724, 0)
+    backend.add_board(2724, 3)
+    cache = discovery.discovery_cache()
+    b = tools.open(2724, 3, backend=backend, cache=cache, pool=False)
+    assert b.board_id == '3'
+    assert sorted(entry[1] for entry in cache.slots.values()) == ['0', '3']
+    return
+
+
+def test_stale_rsw_is_probed_again(backend):
+    board = backend.add_board(2724, 0)
+    cache = discovery.discovery_cache()
+    assert tools.open(2724, 0, backend=backend, cache=cache, pool=False) is not None
+
+    # the RSW switch changed after the slot was recorded
+    board.mem[0][0x0f] = 5
+    assert tools.open(2724, 0, backend=backend, cache=cache, pool=False) is None
+    b = tools.open(2724, 5, backend=backend, cache=cache, pool=False)
+    assert b.board_id == '5'
+    assert list(cache.slots.values()) == [[2724, '5']]
+    return
+
+
+def test_stale_slots_are_dropped_on_load(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    old = sim.sim_backend()
+    old.add_board(2724, 1)
+    old.add_board(6204, 2)
+    cache = discovery.discovery_cache(path)
+    tools.open(2724, 1, backend=old, cache=cache, pool=False)
+    tools.open(6204, 2, backend=old, cache=cache, pool=False)
+    assert len(discovery.discovery_cache(path).slots) == 2
+
+    # the 2724 moved to another slot, the 6204 is gone
+    new = sim.sim_backend()
+    new.add_board(3177, 0)
+    new.add_board(2724, 1)
+    cache = discovery.discovery_cache(path)
+    b = tools.open(2724, 1, backend=new, cache=cache, pool=False)
+    assert b.board_id == '1'
+    key = cache.slot_key(new.lspci(0x1147, 2724)[0])
+    assert cache.slots[key] == [2724, '1']
+
+    # records of other devices are checked when that device is looked up
+    assert [e[0] for e in cache.slots.values()].count(6204) == 1
+    cache.validate(6204, new.lspci(0x1147, 6204))
+    assert cache.slots == {key: [2724, '1']}
+    cache.save()
+    assert discovery.discovery_cache(path).slots == {key: [2724, '1']}
+    return
+
+
+def test_stale_slots_are_probed_once(backend, monkeypatch):
+    backend.add_board(2724, 0)
+    backend.add_board(2724, 3)
+    confs = backend.lspci(0x1147, 2724)
+    cache = discovery.discovery_cache()
+    # both records are stale: the boards were swapped
+    cache.store(confs[0], '3')
+    cache.store(confs[1], '0')
+
+    probes = []
+    open2724 = tools.open_func[2724]
+    def counting_open(conf, backend):
+        probes.append(confs.index(conf))
+        return open2724(conf, backend)
+    monkeypatch.setitem(tools.open_func, 2724, counting_open)
+
+    b = tools.open(2724, 3, backend=backend, cache=cache, pool=False)
+    assert b.board_id == '3'
+    assert probes == [0, 1]
+    return
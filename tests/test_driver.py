@@ -0,0 +1,243 @@
+import random
+import time
+
+import pytest
+
+from pyinterface import core
+
+
+def old_set_flag_bytes(flag_list, flag):
+    # previous set_flag(): one '0'/'1' per entry of the register's table
+    flags = flag.split()
+    bit = ''.join('1' if f in flags else '0' for f in flag_list)
+    return core.bit2bytes(bit)
+
+
+@pytest.mark.parametrize('device_id', [2724, 3177, 6204, 7204, 7415])
+def test_set_flag_encoding(open_board, device_id):
+    driver, rec = open_board(device_id)
+    rng = random.Random(device_id)
+    for bar_num, table in enumerate(driver.bit_flags_out):
+        for offset, flag_list in enumerate(table):
+            if (bar_num, offset) in driver.always_write_registers:
+                continue
+            names = [f for f in flag_list if f != '']
+            for _ in range(5):
+                flag = ' '.join(rng.sample(names + ['NOT_A_FLAG'],
+                                           rng.randint(0, len(names))))
+                rec.log = []
+                driver.set_flag(bar_num, offset, flag)
+                assert rec.writes() == [(offset, old_set_flag_bytes(flag_list, flag))]
+                continue
+            continue
+        continue
+    return
+
+
+def test_write_suppression(open_board):
+    driver, rec = open_board(2724)
+    driver.set_write_suppression(True)
+    driver.write(0, 0x00, b'\x01')
+    driver.write(0, 0x00, b'\x01')
+    driver.write(0, 0x00, b'\x02')
+    driver.write(0, 0x08, b'\x01')
+    driver.write(0, 0x08, b'\x01')
+    assert rec.writes() == [(0x00, b'\x01'), (0x00, b'\x02'),
+                            (0x08, b'\x01'), (0x08, b'\x01')]
+
+    # bytes not written since enabling are never suppressed
+    driver.write(0, 0x01, b'\x00')
+    assert rec.writes()[-1] == (0x01, b'\x00')
+
+    driver.set_write_suppression(False)
+    driver.write(0, 0x00, b'\x02')
+    assert rec.writes()[-1] == (0x00, b'\x02')
+    return
+
+
+def test_transaction_merges_writes(open_board):
+    driver, rec = open_board(2724)
+    with driver.transaction():
+        driver.write(0, 0x00, b'\x01')
+        driver.write(0, 0x01, b'\x02')
+        driver.write(0, 0x02, b'\x03\x04')
+        driver.write(0, 0x01, b'\x05')
+        assert rec.writes() == []
+        pass
+    assert rec.writes() == [(0x00, b'\x01\x05\x03\x04')]
+    return
+
+
+def test_transaction_keeps_always_write_registers_separate(open_board):
+    driver, rec = open_board(2724)
+    assert (0, 0x08) in driver.always_write_registers
+    with driver.transaction():
+        driver.write(0, 0x08, b'\x01')
+        driver.write(0, 0x08, b'\x02')
+        driver.write(0, 0x08, b'\x02')
+        pass
+    assert rec.writes() == [(0x08, b'\x01'), (0x08, b'\x02'), (0x08, b'\x02')]
+    return
+
+
+def test_transaction_does_not_merge_across_always_write_registers(open_board):
+    driver, rec = open_board(2724)
+    with driver.transaction():
+        driver.write(0, 0x06, b'\x01\x02')
+        driver.write(0, 0x08, b'\x03')
+        driver.write(0, 0x09, b'\x04')
+        driver.write(0, 0x0a, b'\x05')
+        pass
+    assert rec.writes() == [(0x06, b'\x01\x02'), (0x08, b'\x03'),
+                            (0x09, b'\x04'), (0x0a, b'\x05')]
+    return
+
+
+def test_pci3346_output_da_in_one_transaction(open_board):
+    driver, rec = open_board(3346)
+    driver.initialize()
+    rec.log = []
+    driver.output_da([{'ch_no': 2, 'range': '5V'}], [1.0])
+    # channel/range selection, data and strobes stay separate and in order
+    offsets = [offset for offset, data in rec.writes()]
+    assert offsets == [0x1b, 0x05, 0x07, 0x06, 0x02, 0x00, 0x05]
+    return
+
+
+def test_transaction_flushes_before_read(open_board):
+    driver, rec = open_board(2724)
+    with driver.transaction():
+        driver.write(0, 0x00, b'\x01')
+        driver.read(0, 0x00, 1)
+        assert [op[0] for op in rec.log] == ['w', 'r']
+        pass
+    return
+
+
+def test_wait_until_timeout(open_board):
+    driver, rec = open_board(2724)
+    t0 = time.perf_counter()
+    with pytest.raises(core.WaitTimeoutError):
+        driver.wait_until(0, 0x00, 0x01, 0x01, timeout=0.02)
+        pass
+    elapsed = time.perf_counter() - t0
+    assert 0.02 <= elapsed < 0.5
+    return
+
+
+def test_wait_until_returns_when_matched(backend, open_board):
+    driver, rec = open_board(2724)
+    board = backend.get_board(2724, 0)
+    polls = []
+    def hook(board, bar_num, offset):
+        polls.append(offset)
+        if len(polls) == 5:
+            board.mem[0][0x00] = 0x01
+            pass
+        return
+    board.read_hooks[(0, 0x00)] = hook
+    elapsed, n = driver.wait_until(0, 0x00, 0x01, 0x01, timeout=1.0)
+    assert n == 5
+    return
+
+
+def test_state_round_trip(open_board, tmp_path):
+    driver, rec = open_board(6204)
+    driver.set_write_suppression(True)
+    driver.set_mode('MD0', 1, 0, 1, 1)
+    driver.set_comparator(b'\x05\x00\x00\x00', 1)
+    path = str(tmp_path / 'state')
+    driver.save_state(path)
+    shadow = driver.snapshot_shadow()
+    comparator = dict(driver.comparator)
+    latch_status = dict(driver.latch_status)
+
+    driver.set_comparator(b'\x07\x00\x00\x00', 2)
+    driver.set_write_suppression(False)
+    assert driver.restore_state(path, verify=False)
+    assert driver.comparator == comparator
+    assert driver.latch_status == latch_status
+    assert driver.snapshot_shadow() == shadow
+    assert driver.suppress_redundant_writes
+    return
+
+
+def test_state_is_not_unpickled(open_board):
+    import pickle
+    driver, rec = open_board(2724)
+    assert not driver.restore_state(pickle.dumps({'format': driver.state_format}))
+    with pytest.raises(ValueError):
+        driver.restore_state(driver.save_state()[:-1])
+        pass
+    return
+
+
+@pytest.mark.parametrize('device_id, num', [(2724, 32), (2702, 64)])
+def test_output_point_writes_aligned_spans(backend, open_board, device_id, num):
+    driver, rec = open_board(device_id)
+    board = backend.get_board(device_id, 0)
+    rng = random.Random(device_id)
+    ref = [0] * num
+    for _ in range(500):
+        start = rng.randint(1, num)
+        n = rng.randint(1, num - start + 1)
+        bits = [rng.randint(0, 1) for _ in range(n)]
+        before = core.list2bytes(ref)
+        rec.log = []
+        driver.output_point(bits, start)
+        ref[start-1:start-1+n] = bits
+        after = core.list2bytes(ref)
+
+        assert bytes(board.mem[0][0:num//8]) == after
+        [(offset, data)] = rec.writes()
+        assert len(data) in (1, 2, 4, 8)
+        assert offset % len(data) == 0
+        changed = [i for i in range(num//8) if before[i] != after[i]]
+        assert all(offset <= i < offset + len(data) for i in changed)
+        continue
+    return
+
+
+@pytest.mark.parametrize('device_id, num', [(2724, 32), (2702, 64)])
+def test_output_point_range(open_board, device_id, num):
+    driver, rec = open_board(device_id)
+    driver.output_point([1], num)
+    with pytest.raises(ValueError):
+        driver.output_point([1, 1], num)
+        pass
+    with pytest.raises(ValueError):
+        driver.output_point([1], 0)
+        pass
+    return
+
+
+def test_state_without_readback_is_not_verified(open_board):
+    driver, rec = open_board(2724)
+    data = driver.save_state()
+    assert not driver.restore_state(data)
+    assert not driver.state_restored
+    assert driver.restore_state(data, verify=False)
+    assert driver.state_restored
+    return
+
+
+def test_pci7415_state_verified_against_the_chip(backend, open_board):
+    from pyinterface import sim
+    from pyinterface import tools
+    driver, rec = open_board(7415)
+    driver.set_param([1000], 'prfh', 'x')
+    data = driver.save_state()
+
+    # the same board still holds the parameter
+    other = tools.open(7415, 0, backend=backend, pool=False).driver
+    assert other.restore_state(data)
+    assert other._last_param == driver._last_param
+
+    # a reset board does not
+    reset = sim.sim_backend()
+    reset.add_board(7415, 0)
+    fresh = tools.open(7415, 0, backend=reset, pool=False).driver
+    assert not fresh.restore_state(data)
+    assert not fresh.state_restored
+    assert fresh._last_param == {}
+    return
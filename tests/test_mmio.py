@@ -0,0 +1,66 @@
+import struct
+
+import pytest
+
+from pyinterface import mmio
+from pyinterface import pci2724
+from pyinterface import sim
+
+
+@pytest.fixture
+def resource(tmp_path):
+    # a temporary file standing in for a sysfs resourceN file
+    path = tmp_path / 'resource0'
+    path.write_bytes(bytes(4096))
+    bar = sim.BaseAddressRegister('mem', 0xf7d00000, 16)
+    backend = mmio.mmio_backend({bar: str(path)})
+    yield backend, bar, path
+    backend.close()
+    return
+
+
+def test_read_write(resource):
+    backend, bar, path = resource
+    backend.write(bar, 2, b'\x01\x02\x03')
+    assert backend.read(bar, 0, 6) == b'\x00\x00\x01\x02\x03\x00'
+    assert path.read_bytes()[0:6] == b'\x00\x00\x01\x02\x03\x00'
+    assert backend.read_uint(bar, 2, 2) == 0x0201
+    assert backend.unpack_from('<BH', bar, 2) == (1, 0x0302)
+    buf = bytearray(8)
+    assert backend.read_into(bar, 2, buf, 4, 3) == 3
+    assert buf == b'\x00\x00\x00\x00\x01\x02\x03\x00'
+    return
+
+
+def test_bad_access(resource):
+    backend, bar, path = resource
+    with pytest.raises(mmio.BadAccessError):
+        backend.read(bar, 15, 2)
+        pass
+    with pytest.raises(mmio.BadAccessError):
+        backend.write(bar, -1, b'\x00')
+        pass
+    return
+
+
+def test_driver_over_mmio(resource):
+    backend, bar, path = resource
+    conf = sim.PCIConfigHeader(0x1147, 2724, [bar])
+    data = bytearray(path.read_bytes())
+    data[0x0f] = 0x07
+    path.write_bytes(bytes(data))
+    driver = pci2724.pci2724_driver(conf, backend)
+    assert driver.board_id == '7'
+    driver.output_point([1, 1, 0, 1], 9)
+    assert path.read_bytes()[1] == 0b1011
+    driver.output_point_int(0x12345678)
+    assert struct.unpack_from('<I', path.read_bytes())[0] == 0x12345678
+    return
+
+
+def test_get_backend_returns_one_mmio_backend():
+    from pyinterface import backend
+    b = backend.get_backend('mmio')
+    assert isinstance(b, mmio.mmio_backend)
+    assert backend.get_backend('mmio') is b
+    return
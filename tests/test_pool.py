@@ -0,0 +1,60 @@
+import threading
+
+import pytest
+
+from pyinterface import pool
+from pyinterface import tools
+
+
+def test_open_shares_a_thread_safe_board(backend):
+    backend.add_board(2724, 0)
+    p = pool.board_pool()
+    b1 = tools.open(2724, 0, backend=backend, pool=p)
+    b2 = tools.open(2724, '0', backend=backend, pool=p)
+    assert b1 is b2
+    assert b1.driver._bar_locks is not None
+    assert tools.open(2724, 0, backend=backend, pool=False).driver._bar_locks is None
+    assert not tools.release(b2, p)
+    assert tools.release(b1, p)
+    assert p.entries == {}
+    return
+
+
+def test_failed_restore_finalizes_the_board(backend, tmp_path, monkeypatch):
+    backend.add_board(2724, 0)
+    path = str(tmp_path / 'state')
+    driver = tools.open(2724, 0, backend=backend, pool=False).driver
+    with open(path, 'wb') as f:
+        f.write(driver.save_state()[:-1])
+        pass
+
+    finalized = []
+    monkeypatch.setattr(pool, 'finalize', finalized.append)
+    p = pool.board_pool()
+    with pytest.raises(ValueError):
+        tools.open(2724, 0, backend=backend, state_file=path, pool=p)
+        pass
+    assert len(finalized) == 1
+    assert p.entries == {}
+    return
+
+
+def test_boards_are_opened_in_parallel():
+    p = pool.board_pool()
+    started = threading.Event()
+    proceed = threading.Event()
+    def slow_open():
+        started.set()
+        proceed.wait(5)
+        return 'slow'
+    t = threading.Thread(target=p.acquire, args=('a', slow_open))
+    t.start()
+    started.wait(5)
+    # another key does not wait for the slow open
+    assert p.acquire('b', lambda: 'fast') == 'fast'
+    assert p.refcount('slow') == 0
+    proceed.set()
+    t.join()
+    assert p.acquire('a', lambda: 'again') == 'slow'
+    assert p.refcount('slow') == 2
+    return
@@ -0,0 +1,154 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+from pyinterface import core
+from pyinterface import server
+
+
+values = [
+    None, True, False, 0, -1, 1 << 62, -(1 << 63), 1 << 80, -(1 << 100),
+    0.5, float('inf'), '', 'IN1_8', 'μ', b'', b'\x00\xff', bytearray(b'ab'),
+    [], (), [1, [2, (3, 'x')]], (None, b'z'), {}, {'a': 1, 2: [b'b'], (1, 2): None},
+]
+
+
+@pytest.mark.parametrize('value', values)
+def test_encode_decode_round_trip(value):
+    d = server.decode(server.encode(value))
+    assert d == value
+    assert type(d) == (bytes if isinstance(value, bytearray) else type(value))
+    return
+
+
+def test_encode_decode_flagged_bytes():
+    fb = core.flagged_bytes(b'\x05\x80', (('A', 'B', '', '', '', '', '', ''),
+                                         ('', '', '', '', '', '', '', 'C')), '<H')
+    d = server.decode(server.encode([fb]))[0]
+    assert isinstance(d, core.flagged_bytes)
+    assert d.bytes == fb.bytes
+    assert d.to_flags() == fb.to_flags()
+    assert d.unpack() == fb.unpack()
+    return
+
+
+def test_encode_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        server.encode(object())
+        pass
+    return
+
+
+def test_frames_over_a_socket():
+    a, b = socket.socketpair()
+    try:
+        # recv_frame returns None at EOF, so no None payload here
+        frames = [v for v in values if v is not None]
+        for v in frames:
+            server.send_frame(a, v)
+            continue
+        a.close()
+        got = []
+        while True:
+            f = server.recv_frame(b)
+            if f is None:
+                break
+            got.append(f)
+            continue
+        assert got == [bytes(v) if isinstance(v, bytearray) else v for v in frames]
+    finally:
+        b.close()
+        pass
+    return
+
+
+@pytest.fixture
+def client(backend, tmp_path):
+    backend.add_board(2724, 0)
+    path = str(tmp_path / 'pyinterface.sock')
+    srv = server.board_server(path, backend)
+    t = threading.Thread(target=srv.serve_forever, daemon=True)
+    t.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+        continue
+    c = server.connect(path)
+    yield c, srv
+    c.close()
+    srv.close()
+    t.join()
+    return
+
+
+def test_server_calls_and_keys(client):
+    c, srv = client
+    b = c.open(2724, 0)
+    b.output_point([1, 0, 1], 1)
+    # the simulated board reads the output registers back
+    assert c.call(2724, '0', 'input_point', 1, 3) == [1, 0, 1]
+    assert b.driver.get_log('out', 0, 0).to_list()[:3] == [1, 0, 1]
+    assert list(srv.boards) == [(2724, '0')]
+    return
+
+
+@pytest.mark.parametrize('method', [
+    'driver.restore_state', 'driver.save_state', 'driver.backend.write',
+    'driver._bus_write', 'driver.set_shared_shadow', 'driver.finalize',
+    'driver.lock', '__class__', 'input_byte.__globals__',
+])
+def test_server_rejects_internals(client, method):
+    c, srv = client
+    with pytest.raises(AttributeError):
+        c.call(2724, 0, method, b'')
+        pass
+    return
+
+
+@pytest.mark.parametrize('frame', [
+    5, 'call', {}, [], [0], [server.OP_BATCH, 7], [server.OP_BATCH, 7, 3],
+    [9, 7], [server.OP_CALL, 7, 2724],
+])
+def test_server_answers_malformed_requests(client, frame):
+    c, srv = client
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.connect(srv.path)
+    try:
+        server.send_frame(s, frame)
+        req_id, ok, value = server.recv_frame(s)
+        assert not ok
+        assert value[0] == 'ValueError'
+        # the connection is still served
+        server.send_frame(s, [server.OP_CALL, 8, 2724, 0, 'board_id', [], {}])
+        assert server.recv_frame(s) == [8, True, '0']
+    finally:
+        s.close()
+        pass
+    return
+
+
+def test_server_opens_boards_in_parallel(client, backend, monkeypatch):
+    from pyinterface import tools
+    c, srv = client
+    backend.add_board(6204, 0)
+    started = threading.Event()
+    proceed = threading.Event()
+    open2724 = tools.open_func[2724]
+    def slow_open(conf, backend):
+        started.set()
+        proceed.wait(5)
+        return open2724(conf, backend)
+    monkeypatch.setitem(tools.open_func, 2724, slow_open)
+
+    slow = c.submit(2724, 0, 'board_id')
+    started.wait(5)
+    # another client is served while the 2724 is being opened
+    with server.connect(srv.path) as other:
+        assert other.call(6204, 0, 'board_id') == '0'
+        pass
+    assert not slow.done()
+    proceed.set()
+    assert slow.result(5) == '0'
+    return
@@ -0,0 +1,87 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from pyinterface import shm
+from pyinterface import tools
+
+
+@pytest.fixture(autouse=True)
+def private_names(monkeypatch):
+    # segments and lock files of this test run only
+    prefix = 'pyinterface_test{0}'.format(os.getpid())
+    monkeypatch.setattr(shm, 'name_prefix', prefix)
+    yield
+    for name in os.listdir(shm.lock_dir):
+        if name.startswith(prefix) and name.endswith('.lock'):
+            os.remove(os.path.join(shm.lock_dir, name))
+            pass
+        continue
+    return
+
+
+def test_unshare_restores_lock_mode(open_board):
+    driver, rec = open_board(2724)
+    driver.set_shared_shadow()
+    assert driver._bar_locks is not None
+    driver.set_shared_shadow(False, unlink=True)
+    assert driver._bar_locks is None
+
+    driver.set_thread_safe()
+    locks = driver._bar_locks
+    driver.set_shared_shadow()
+    driver.set_shared_shadow(False, unlink=True)
+    assert driver._bar_locks is locks
+    return
+
+
+def test_drivers_share_one_lock_file(backend):
+    backend.add_board(2724, 0)
+    a = tools.open(2724, 0, backend=backend, pool=False).driver
+    b = tools.open(2724, 0, backend=backend, pool=False).driver
+    a.set_shared_shadow()
+    b.set_shared_shadow()
+    assert a._shm_fd == b._shm_fd
+    assert a._bar_locks[0] is b._bar_locks[0]
+    a.output_point([1], 1)
+    assert b.get_log('out', 0, 0).to_list()[0] == 1
+
+    # the first driver leaving keeps the fd (and the locks on it) open
+    fd = b._shm_fd
+    a.set_shared_shadow(False)
+    os.fstat(fd)
+    with b.lock(0):
+        b.output_point([0], 1)
+        pass
+    b.set_shared_shadow(False, unlink=True)
+    with pytest.raises(OSError):
+        os.fstat(fd)
+        pass
+    return
+
+
+def test_unlink_of_removed_segment_leaves_no_tracker_entry():
+    # the resource tracker warns at exit about segments left registered
+    script = '''if True:
+        import _posixshmem
+        from pyinterface import shm, sim, tools
+        shm.name_prefix = {prefix!r}
+        backend = sim.sim_backend()
+        backend.add_board(2724, 0)
+        driver = tools.open(2724, 0, backend=backend, pool=False).driver
+        driver.set_shared_shadow()
+        for shadow in driver.log_bytes_in + driver.log_bytes_out:
+            _posixshmem.shm_unlink(shadow.shm._name)
+            continue
+        driver.set_shared_shadow(False, unlink=True)
+    '''.format(prefix=shm.name_prefix)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    p = subprocess.run([sys.executable, '-c', script], env=env,
+                       capture_output=True, text=True, timeout=60)
+    assert p.returncode == 0, p.stderr
+    assert 'leaked' not in p.stderr
+    assert 'Traceback' not in p.stderr
+    return
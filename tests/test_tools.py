@@ -0,0 +1,25 @@
+import importlib.metadata
+
+import pytest
+
+from pyinterface import tools
+
+
+def test_entry_points_with_invalid_names_are_skipped(monkeypatch):
+    group = tools.entry_point_group
+    eps = importlib.metadata.EntryPoints([
+        importlib.metadata.EntryPoint('pci9999', 'foo:open9999', group),
+        importlib.metadata.EntryPoint('9999', 'pyinterface.tools:open2724', group),
+    ])
+    monkeypatch.setattr(importlib.metadata, 'entry_points', lambda: eps)
+    monkeypatch.setattr(tools, '_entry_points', None)
+    monkeypatch.setattr(tools, 'open_func', dict(tools.open_func))
+
+    with pytest.warns(RuntimeWarning, match='pci9999'):
+        with pytest.raises(KeyError):
+            tools.get_open_func(1234)
+            pass
+        pass
+    assert list(tools._entry_points) == [9999]
+    assert tools.get_open_func(9999) is tools.open2724
+    return